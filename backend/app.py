@@ -4,19 +4,45 @@ Flask backend for blog posts, comments, and admin authentication
 """
 
 import os
+import time
 import uuid
+import atexit
+import json
+import base64
+import hashlib
+import tempfile
+import queue
+import random
+import cProfile
+import itertools
 import sqlite3
-from datetime import datetime, timedelta
+import threading
+from datetime import datetime, timedelta, timezone
 from flask import Flask, request, jsonify, g, send_from_directory
 from flask_cors import CORS
 from functools import wraps
 import re
 import html
 import jwt
-import bcrypt
 import secrets
 from werkzeug.middleware.proxy_fix import ProxyFix
+from werkzeug.http import parse_content_range_header
 from werkzeug.utils import secure_filename
+from werkzeug.sansio.multipart import MultipartDecoder, File, Data, Epilogue, NEED_DATA
+from cache import create_cache
+from metrics import Registry, COUNT_BUCKETS
+import images
+import prerender
+import feeds
+from ratelimit import TokenBucketLimiter, DuplicateFilter
+from writebehind import WriteBehindQueue, QueueFull
+from auth import VerifiedTokenCache, token_hash
+from passwords import PasswordHasher, HasherBusy, hash_password
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
 
 app = Flask(__name__)
 app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1, x_host=1, x_prefix=1)
@@ -27,29 +53,301 @@ CORS(app, supports_credentials=True)
 DATABASE = os.environ.get('DATABASE_PATH', '/app/data/blog.db')
 UPLOAD_DIR = os.path.join(os.path.dirname(DATABASE), 'uploads')
 ALLOWED_EXTENSIONS = {'jpg', 'jpeg', 'png', 'webp', 'gif'}
-MAX_UPLOAD_SIZE = 5 * 1024 * 1024  # 5MB
+MAX_UPLOAD_SIZE = int(os.environ.get('MAX_UPLOAD_SIZE', 5 * 1024 * 1024))  # 5MB
+UPLOAD_CHUNK_SIZE = 64 * 1024  # read/write buffer while streaming an upload to disk
+UPLOAD_SESSION_DIR = os.path.join(UPLOAD_DIR, 'sessions')  # partial resumable uploads
+UPLOAD_SESSION_CHUNK = 1024 * 1024  # suggested PUT size for resumable uploads
+UPLOAD_MAX_AGE = 365 * 24 * 3600  # uploads are content-addressed, so cache them for a year
+UPLOAD_ACCEL_PREFIX = os.environ.get('UPLOAD_ACCEL_PREFIX', '')  # nginx internal location for X-Accel-Redirect
+UPLOAD_GC_GRACE = int(os.environ.get('UPLOAD_GC_GRACE', 86400))  # seconds an unreferenced upload is kept
+UPLOAD_GC_MIN_GRACE = 3600  # in-progress temp files and resumable sessions are kept at least this long
+VARIANT_DIR = os.path.join(UPLOAD_DIR, 'variants')
+STATIC_DIR = os.environ.get('STATIC_DIR', os.path.join(os.path.dirname(DATABASE), 'static'))  # pre-rendered pages nginx serves
+SITE_URL = os.environ.get('SITE_URL', 'https://jja-instruments.com')  # for canonical links in pre-rendered pages
+STATIC_PAGE_SIZE = int(os.environ.get('STATIC_PAGE_SIZE', 10))  # posts per pre-rendered list page
+SITEMAP_SHARD_SIZE = int(os.environ.get('SITEMAP_SHARD_SIZE', 1000))  # post ids per sitemap file (protocol max 50000)
+FEED_SIZE = int(os.environ.get('FEED_SIZE', 20))  # newest posts in the RSS/Atom feeds
+IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS', 2))
+IMAGE_VARIANT_TIMEOUT = float(os.environ.get('IMAGE_VARIANT_TIMEOUT', 10))  # seconds to wait on first request
 JWT_SECRET = os.environ.get('JWT_SECRET', secrets.token_hex(32))
 JWT_EXPIRY_HOURS = int(os.environ.get('JWT_EXPIRY_HOURS', 720))  # 30 days default
 ADMIN_KEY = os.environ.get('ADMIN_KEY', 'change-this-in-production')
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', 12))  # cost for new hashes; older hashes are upgraded on login
+BCRYPT_WORKERS = int(os.environ.get('BCRYPT_WORKERS', 1))  # concurrent bcrypt calls per process
+BCRYPT_QUEUE_SIZE = int(os.environ.get('BCRYPT_QUEUE_SIZE', 8))  # password checks allowed to wait before 503
+LOGIN_RATE_PER_MINUTE = float(os.environ.get('LOGIN_RATE_PER_MINUTE', 5))  # per client IP and per account
+LOGIN_BURST = int(os.environ.get('LOGIN_BURST', 10))
+TOKEN_CACHE_SIZE = int(os.environ.get('TOKEN_CACHE_SIZE', 1024))  # verified JWTs remembered per worker, 0 disables
+POST_COUNT_TTL = int(os.environ.get('POST_COUNT_TTL', 60))  # seconds
+RESPONSE_CACHE_SIZE = int(os.environ.get('RESPONSE_CACHE_SIZE', 512))  # entries, 0 disables
+RESPONSE_CACHE_TTL = int(os.environ.get('RESPONSE_CACHE_TTL', 300))  # seconds
+SQLITE_CACHE_SIZE_KB = int(os.environ.get('SQLITE_CACHE_SIZE_KB', 16384))  # page cache per connection
+SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 64 * 1024 * 1024))
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+SQLITE_STATEMENT_CACHE = int(os.environ.get('SQLITE_STATEMENT_CACHE', 256))  # prepared statements per connection
+DB_READ_POOL_SIZE = int(os.environ.get('DB_READ_POOL_SIZE', os.environ.get('GUNICORN_THREADS', 8)))
+DB_ACQUIRE_TIMEOUT = float(os.environ.get('DB_ACQUIRE_TIMEOUT', 10))  # seconds to wait for a connection
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'memory')  # memory or sqlite
+CACHE_DIR = os.environ.get('CACHE_DIR', os.path.join(os.path.dirname(DATABASE), 'cache'))
+COMMENT_RATE_PER_MINUTE = float(os.environ.get('COMMENT_RATE_PER_MINUTE', 5))  # per client IP and per email
+COMMENT_BURST = int(os.environ.get('COMMENT_BURST', 5))
+COMMENT_DUPLICATE_WINDOW = int(os.environ.get('COMMENT_DUPLICATE_WINDOW', 600))  # seconds
+COMMENT_QUEUE_SIZE = int(os.environ.get('COMMENT_QUEUE_SIZE', 10000))  # comments waiting to be written
+COMMENT_BATCH_SIZE = int(os.environ.get('COMMENT_BATCH_SIZE', 100))  # comments per write transaction
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  # if set, /metrics requires it
+PROFILE_REQUESTS = os.environ.get('PROFILE_REQUESTS', 'false').lower() == 'true'
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0.01))
+PROFILE_SLOW_MS = float(os.environ.get('PROFILE_SLOW_MS', 500))
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(os.path.dirname(DATABASE), 'profiles'))
+
+# Columns clients may request via ?fields= on post listings. The default list
+# shape leaves out the full HTML body, which list views never render.
+POST_FIELDS = (
+    'id', 'title', 'slug', 'excerpt', 'content', 'author', 'category', 'tags',
+    'featured_image', 'published', 'created_at', 'updated_at', 'comment_count'
+)
+POST_LIST_FIELDS = tuple(f for f in POST_FIELDS if f != 'content')
+
+# Full-text search settings
+SEARCH_MAX_TERMS = 10
+SEARCH_MARK_START = '\x02'
+SEARCH_MARK_END = '\x03'
+
+# Upload URLs embedded in post content and featured images
+UPLOAD_URL_RE = re.compile(r'/api/uploads/([A-Za-z0-9_.-]+)')
+
+# Root comments per page on comment endpoints, and slugs per batch request
+COMMENTS_PER_PAGE = 50
+COMMENTS_MAX_PER_PAGE = 200
+COMMENTS_BATCH_MAX_POSTS = 50
+
+# Cached COUNT(*) results for post listings, keyed on the WHERE clause and its params
+post_count_cache = {}
+POST_COUNT_CACHE_SIZE = 256
+
+# Serialized responses for anonymous reads, invalidated by the admin write handlers.
+# Invalidations reach every gunicorn worker through the shared generation file.
+response_cache = create_cache(CACHE_BACKEND, RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL, CACHE_DIR)
+
+# Recently verified JWTs; revocations clear it in every worker via the same generation file
+token_cache = VerifiedTokenCache(TOKEN_CACHE_SIZE, response_cache.generations)
+
+# bcrypt off the request threads, behind per-client and per-account attempt limits
+password_hasher = PasswordHasher(BCRYPT_ROUNDS, BCRYPT_WORKERS, BCRYPT_QUEUE_SIZE)
+login_ip_limiter = TokenBucketLimiter(LOGIN_RATE_PER_MINUTE / 60, LOGIN_BURST)
+login_account_limiter = TokenBucketLimiter(LOGIN_RATE_PER_MINUTE / 60, LOGIN_BURST)
+
+# Static copies of published posts and list pages, plus sitemaps and feeds, written when posts change
+static_site = prerender.StaticSite(STATIC_DIR, SITE_URL, STATIC_PAGE_SIZE)
+syndication = feeds.Syndication(STATIC_DIR, SITE_URL, SITEMAP_SHARD_SIZE, FEED_SIZE)
+
+# Resized/re-encoded upload variants, rendered on a background thread pool
+image_pipeline = images.ImagePipeline(UPLOAD_DIR, VARIANT_DIR, IMAGE_WORKERS)
+
+# Comment intake: per-client limits, duplicate suppression, and a background writer
+comment_ip_limiter = TokenBucketLimiter(COMMENT_RATE_PER_MINUTE / 60, COMMENT_BURST)
+comment_email_limiter = TokenBucketLimiter(COMMENT_RATE_PER_MINUTE / 60, COMMENT_BURST)
+comment_duplicates = DuplicateFilter(COMMENT_DUPLICATE_WINDOW)
+
+# Per-process request metrics, served from /metrics
+metrics = Registry()
+requests_total = metrics.counter('blog_api_requests_total', 'HTTP requests handled', ('route', 'method', 'status'))
+request_duration = metrics.histogram('blog_api_request_duration_seconds', 'Request latency', ('route', 'method'))
+response_bytes = metrics.counter('blog_api_response_bytes_total', 'Response body bytes sent', ('route',))
+db_queries = metrics.histogram('blog_api_db_queries_per_request', 'SQLite statements per request', ('route',), COUNT_BUCKETS)
+db_query_seconds = metrics.counter('blog_api_db_query_seconds_total', 'Time spent executing SQLite statements', ('route',))
+cache_requests = metrics.counter('blog_api_cache_requests_total', 'Cacheable requests by cache result', ('route', 'result'))
+cache_hits = metrics.counter('blog_api_response_cache_hits_total', 'Response cache hits in this worker')
+cache_misses = metrics.counter('blog_api_response_cache_misses_total', 'Response cache misses in this worker')
+cache_entries = metrics.gauge('blog_api_response_cache_entries', 'Entries held by the response cache')
+comment_queue_depth = metrics.gauge('blog_api_comment_queue_depth', 'Comments accepted but not yet written')
+comment_batch_size = metrics.histogram('blog_api_comment_batch_size', 'Comments written per transaction', buckets=COUNT_BUCKETS)
+comments_rejected = metrics.counter('blog_api_comments_rejected_total', 'Comment submissions turned away', ('reason',))
+login_attempts = metrics.counter('blog_api_login_attempts_total', 'Password checks by outcome', ('result',))
+token_cache_requests = metrics.counter('blog_api_token_cache_requests_total', 'Bearer token verifications by cache result', ('result',))
+
+# Query count/time for the request running on this thread
+request_stats = threading.local()
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connection that adds statement count and time to the current request's stats."""
+    
+    def execute(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().execute(*args, **kwargs)
+        finally:
+            record_query(time.perf_counter() - start)
+    
+    def executemany(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().executemany(*args, **kwargs)
+        finally:
+            record_query(time.perf_counter() - start)
+
+def record_query(duration):
+    stats = getattr(request_stats, 'current', None)
+    if stats is not None:
+        stats['queries'] += 1
+        stats['query_time'] += duration
+
+class DatabaseBusy(Exception):
+    pass
+
+class UploadRejected(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+class ConnectionPool:
+    """Bounded pool of read-only connections shared by a worker's threads."""
+    
+    def __init__(self, size, timeout):
+        self.size = size
+        self.timeout = timeout
+        self._reset()
+    
+    def _reset(self):
+        self._pid = os.getpid()
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+    
+    def acquire(self):
+        if self._pid != os.getpid():
+            # Never share connections with the parent after a fork
+            self._reset()
+        
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        
+        with self._lock:
+            can_create = self._created < self.size
+            if can_create:
+                self._created += 1
+        
+        if can_create:
+            try:
+                conn = connect_db()
+                conn.execute('PRAGMA query_only = ON')
+                return conn
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise DatabaseBusy('No database connection available')
+    
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+# Reads go through the pool; all writes in a worker share one connection
+# guarded by a lock, so threads queue here instead of on SQLite's file lock
+read_pool = ConnectionPool(DB_READ_POOL_SIZE, DB_ACQUIRE_TIMEOUT)
+write_lock = threading.Lock()
+writer = {'conn': None, 'pid': None}
+
+def connect_db():
+    conn = sqlite3.connect(
+        DATABASE,
+        timeout=SQLITE_BUSY_TIMEOUT_MS / 1000,
+        cached_statements=SQLITE_STATEMENT_CACHE,
+        check_same_thread=False,
+        factory=InstrumentedConnection
+    )
+    conn.row_factory = sqlite3.Row
+    conn.create_function('strip_html', 1, strip_html, deterministic=True)
+    
+    # Per-connection settings; journal_mode=WAL is persisted in the file by init_db
+    conn.execute(f'PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}')
+    conn.execute('PRAGMA synchronous = NORMAL')
+    conn.execute('PRAGMA foreign_keys = ON')
+    conn.execute('PRAGMA temp_store = MEMORY')
+    conn.execute(f'PRAGMA cache_size = -{SQLITE_CACHE_SIZE_KB}')
+    conn.execute(f'PRAGMA mmap_size = {SQLITE_MMAP_SIZE}')
+    return conn
 
 def get_db():
+    """Read-only connection borrowed from the pool for the rest of the request."""
     db = getattr(g, '_database', None)
     if db is None:
-        db = g._database = sqlite3.connect(DATABASE)
-        db.row_factory = sqlite3.Row
+        db = g._database = read_pool.acquire()
+    return db
+
+def get_write_db():
+    """The worker's writer connection, held exclusively until the request ends."""
+    db = getattr(g, '_write_database', None)
+    if db is None:
+        if not write_lock.acquire(timeout=DB_ACQUIRE_TIMEOUT):
+            raise DatabaseBusy('Database is busy')
+        try:
+            db = g._write_database = writer_connection()
+        except Exception:
+            write_lock.release()
+            raise
     return db
 
+def writer_connection():
+    """This process's writer connection; the caller must hold write_lock."""
+    if writer['conn'] is None or writer['pid'] != os.getpid():
+        writer['conn'] = connect_db()
+        writer['pid'] = os.getpid()
+    return writer['conn']
+
 @app.teardown_appcontext
 def close_connection(exception):
-    db = getattr(g, '_database', None)
+    # Connections stay open for later requests; just hand them back and make
+    # sure a failed request doesn't leave a transaction holding locks
+    db = g.pop('_database', None)
+    if db is not None:
+        read_pool.release(db)
+    
+    db = g.pop('_write_database', None)
     if db is not None:
-        db.close()
+        try:
+            if db.in_transaction:
+                db.rollback()
+        finally:
+            write_lock.release()
+
+@app.errorhandler(DatabaseBusy)
+def database_busy(error):
+    response = jsonify({'error': 'Service busy, please retry'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+@app.errorhandler(HasherBusy)
+def hasher_busy(error):
+    login_attempts.inc('busy')
+    response = jsonify({'error': 'Service busy, please retry'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+@app.errorhandler(UploadRejected)
+def upload_rejected(error):
+    return jsonify({'error': str(error)}), error.status
+
+def version_bump_sql(scope):
+    return f'''
+        INSERT INTO content_versions (scope, version, updated_at)
+        VALUES ({scope}, 1, CURRENT_TIMESTAMP)
+        ON CONFLICT (scope) DO UPDATE SET version = version + 1, updated_at = CURRENT_TIMESTAMP;
+    '''
 
 def init_db():
     os.makedirs(os.path.dirname(DATABASE), exist_ok=True)
     os.makedirs(UPLOAD_DIR, exist_ok=True)
     
-    conn = sqlite3.connect(DATABASE)
+    conn = connect_db()
+    conn.execute('PRAGMA journal_mode = WAL')
     cursor = conn.cursor()
     
     cursor.execute('''
@@ -65,10 +363,21 @@ def init_db():
             featured_image TEXT,
             published BOOLEAN DEFAULT 1,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            comment_count INTEGER NOT NULL DEFAULT 0
         )
     ''')
     
+    # comment_count was added later; existing databases get the column and a recount
+    post_columns = {row[1] for row in cursor.execute('PRAGMA table_info(posts)')}
+    if 'comment_count' not in post_columns:
+        cursor.execute('ALTER TABLE posts ADD COLUMN comment_count INTEGER NOT NULL DEFAULT 0')
+        cursor.execute('''
+            UPDATE posts SET comment_count = (
+                SELECT COUNT(*) FROM comments WHERE post_id = posts.id AND approved = 1
+            )
+        ''')
+    
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS comments (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -79,11 +388,16 @@ def init_db():
             content TEXT NOT NULL,
             approved BOOLEAN DEFAULT 1,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            pending_id TEXT,
             FOREIGN KEY (post_id) REFERENCES posts (id) ON DELETE CASCADE,
             FOREIGN KEY (parent_id) REFERENCES comments (id) ON DELETE CASCADE
         )
     ''')
     
+    comment_columns = {row[1] for row in cursor.execute('PRAGMA table_info(comments)')}
+    if 'pending_id' not in comment_columns:
+        cursor.execute('ALTER TABLE comments ADD COLUMN pending_id TEXT')
+    
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS users (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -96,18 +410,144 @@ def init_db():
         )
     ''')
     
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS post_tags (
+            post_id INTEGER NOT NULL,
+            tag TEXT NOT NULL COLLATE NOCASE,
+            PRIMARY KEY (tag, post_id),
+            FOREIGN KEY (post_id) REFERENCES posts (id) ON DELETE CASCADE
+        ) WITHOUT ROWID
+    ''')
+    
+    # Which uploaded files each post uses, so unreferenced ones can be collected
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS upload_refs (
+            filename TEXT NOT NULL,
+            post_id INTEGER NOT NULL,
+            PRIMARY KEY (filename, post_id),
+            FOREIGN KEY (post_id) REFERENCES posts (id) ON DELETE CASCADE
+        ) WITHOUT ROWID
+    ''')
+    
+    # Tokens signed out before their expiry, kept until they would have expired anyway
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS revoked_tokens (
+            token_hash TEXT PRIMARY KEY,
+            expires_at INTEGER NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    
+    # Full-text index over posts, kept in sync by triggers. The body column holds
+    # the content with HTML stripped so markup never matches or shows in snippets.
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5(
+            title, excerpt, body, tags,
+            tokenize = 'porter unicode61 remove_diacritics 2'
+        )
+    ''')
+    
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS posts_fts_insert AFTER INSERT ON posts BEGIN
+            INSERT INTO posts_fts (rowid, title, excerpt, body, tags)
+            VALUES (new.id, new.title, coalesce(new.excerpt, ''), strip_html(new.content), coalesce(new.tags, ''));
+        END
+    ''')
+    
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS posts_fts_delete AFTER DELETE ON posts BEGIN
+            DELETE FROM posts_fts WHERE rowid = old.id;
+        END
+    ''')
+    
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS posts_fts_update AFTER UPDATE OF title, excerpt, content, tags ON posts BEGIN
+            DELETE FROM posts_fts WHERE rowid = old.id;
+            INSERT INTO posts_fts (rowid, title, excerpt, body, tags)
+            VALUES (new.id, new.title, coalesce(new.excerpt, ''), strip_html(new.content), coalesce(new.tags, ''));
+        END
+    ''')
+    
+    # Version counters for conditional GETs. Scopes are 'posts' (any post change),
+    # 'post:<id>' (a single post) and 'comments:<post_id>' (a post's comments).
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS content_versions (
+            scope TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ) WITHOUT ROWID
+    ''')
+    
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS posts_version_insert AFTER INSERT ON posts BEGIN
+            {version_bump_sql("'posts'")}
+            {version_bump_sql("'post:' || new.id")}
+        END
+    ''')
+    
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS posts_version_update AFTER UPDATE ON posts BEGIN
+            {version_bump_sql("'posts'")}
+            {version_bump_sql("'post:' || new.id")}
+        END
+    ''')
+    
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS posts_version_delete AFTER DELETE ON posts BEGIN
+            {version_bump_sql("'posts'")}
+            DELETE FROM content_versions WHERE scope IN ('post:' || old.id, 'comments:' || old.id);
+        END
+    ''')
+    
+    for event, row in (('insert', 'new'), ('update', 'new'), ('delete', 'old')):
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS comments_version_{event} AFTER {event.upper()} ON comments BEGIN
+                {version_bump_sql(f"'comments:' || {row}.post_id")}
+            END
+        ''')
+    
+    # Approved comment count per post, so list views can show it without a query per post
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS comments_count_insert AFTER INSERT ON comments
+        WHEN new.approved = 1 BEGIN
+            UPDATE posts SET comment_count = comment_count + 1 WHERE id = new.post_id;
+        END
+    ''')
+    
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS comments_count_delete AFTER DELETE ON comments
+        WHEN old.approved = 1 BEGIN
+            UPDATE posts SET comment_count = comment_count - 1 WHERE id = old.post_id;
+        END
+    ''')
+    
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS comments_count_update AFTER UPDATE OF approved, post_id ON comments
+        WHEN old.approved IS NOT new.approved OR old.post_id IS NOT new.post_id BEGIN
+            UPDATE posts SET comment_count = comment_count - 1 WHERE id = old.post_id AND old.approved = 1;
+            UPDATE posts SET comment_count = comment_count + 1 WHERE id = new.post_id AND new.approved = 1;
+        END
+    ''')
+    
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_posts_slug ON posts (slug)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_posts_slug_published ON posts (slug, published)')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_posts_published ON posts (published)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_posts_listing ON posts (published, category, created_at, id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_posts_published_created ON posts (published, created_at, id)')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_comments_post_id ON comments (post_id)')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_comments_approved ON comments (approved)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_comments_roots ON comments (post_id, approved, parent_id, created_at, id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_comments_parent_id ON comments (parent_id)')
+    cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_comments_pending_id ON comments (pending_id) WHERE pending_id IS NOT NULL')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_username ON users (username)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_post_tags_post_id ON post_tags (post_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_upload_refs_post_id ON upload_refs (post_id)')
     
     conn.commit()
     
     cursor.execute('SELECT COUNT(*) FROM users')
     if cursor.fetchone()[0] == 0:
         default_password = os.environ.get('ADMIN_PASSWORD', 'admin123')
-        password_hash = bcrypt.hashpw(default_password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        password_hash = hash_password(default_password, BCRYPT_ROUNDS)
         try:
             cursor.execute('''
                 INSERT INTO users (username, email, password_hash, role)
@@ -215,8 +655,82 @@ def init_db():
         
         conn.commit()
     
+    # Rebuild the search index if it is missing rows (e.g. on first run after upgrading)
+    indexed = cursor.execute('SELECT COUNT(*) FROM posts_fts').fetchone()[0]
+    if indexed != cursor.execute('SELECT COUNT(*) FROM posts').fetchone()[0]:
+        cursor.execute('DELETE FROM posts_fts')
+        cursor.execute('''
+            INSERT INTO posts_fts (rowid, title, excerpt, body, tags)
+            SELECT id, title, coalesce(excerpt, ''), strip_html(content), coalesce(tags, '')
+            FROM posts
+        ''')
+        conn.commit()
+    
+    # Seed version counters for posts created before content_versions existed
+    cursor.execute("""
+        INSERT OR IGNORE INTO content_versions (scope, version, updated_at)
+        SELECT 'post:' || id, 1, updated_at FROM posts
+    """)
+    cursor.execute("INSERT OR IGNORE INTO content_versions (scope, version) VALUES ('posts', 1)")
+    conn.commit()
+    
+    # Backfill post_tags for posts created before the table existed
+    untagged = cursor.execute('''
+        SELECT id, tags FROM posts
+        WHERE tags IS NOT NULL AND tags != ''
+        AND id NOT IN (SELECT post_id FROM post_tags)
+    ''').fetchall()
+    for post_id, tags in untagged:
+        sync_post_tags(conn, post_id, tags)
+    conn.commit()
+    
+    # Backfill upload_refs for posts that embedded uploads before the table existed
+    unindexed = cursor.execute('''
+        SELECT id, content, featured_image FROM posts
+        WHERE (content LIKE '%/api/uploads/%' OR featured_image LIKE '%/api/uploads/%')
+        AND id NOT IN (SELECT post_id FROM upload_refs)
+    ''').fetchall()
+    for post_id, content, featured_image in unindexed:
+        sync_upload_refs(conn, post_id, content, featured_image)
+    conn.commit()
+    
     conn.close()
 
+def parse_tags(value):
+    if not value:
+        return []
+    if isinstance(value, (list, tuple)):
+        value = ','.join(str(v) for v in value)
+    
+    tags = []
+    seen = set()
+    for tag in value.split(','):
+        tag = tag.strip()
+        if tag and tag.lower() not in seen:
+            seen.add(tag.lower())
+            tags.append(tag)
+    return tags
+
+def sync_post_tags(db, post_id, tags):
+    db.execute('DELETE FROM post_tags WHERE post_id = ?', (post_id,))
+    db.executemany(
+        'INSERT INTO post_tags (post_id, tag) VALUES (?, ?)',
+        [(post_id, tag) for tag in parse_tags(tags)]
+    )
+
+def sync_upload_refs(db, post_id, *fields):
+    filenames = set()
+    for value in fields:
+        for name in UPLOAD_URL_RE.findall(value or ''):
+            if secure_filename(name) == name:
+                filenames.add(name)
+    
+    db.execute('DELETE FROM upload_refs WHERE post_id = ?', (post_id,))
+    db.executemany(
+        'INSERT INTO upload_refs (filename, post_id) VALUES (?, ?)',
+        [(name, post_id) for name in sorted(filenames)]
+    )
+
 def create_token(user_id, username, role):
     payload = {
         'user_id': user_id,
@@ -228,68 +742,458 @@ def create_token(user_id, username, role):
     return jwt.encode(payload, JWT_SECRET, algorithm='HS256')
 
 def verify_token(token):
+    """Payload of a valid, unrevoked token, or None.
+    
+    Signature checks are skipped for tokens this worker verified recently;
+    the revocation list is only consulted on a cache miss.
+    """
+    key = token_hash(token)
+    payload = token_cache.get(key)
+    if payload is not None:
+        token_cache_requests.inc('hit')
+        return payload
+    token_cache_requests.inc('miss')
+    
+    stamp = token_cache.stamp()
     try:
         payload = jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
-        return payload
-    except jwt.ExpiredSignatureError:
-        return None
     except jwt.InvalidTokenError:
         return None
+    
+    revoked = get_db().execute('SELECT 1 FROM revoked_tokens WHERE token_hash = ?', (key,)).fetchone()
+    if revoked:
+        return None
+    
+    token_cache.set(key, payload, stamp)
+    return payload
+
+def revoke_token(token, expires_at):
+    key = token_hash(token)
+    db = get_write_db()
+    db.execute(
+        'INSERT OR IGNORE INTO revoked_tokens (token_hash, expires_at) VALUES (?, ?)',
+        (key, int(expires_at))
+    )
+    db.execute('DELETE FROM revoked_tokens WHERE expires_at < ?', (int(time.time()),))
+    db.commit()
+    token_cache.revoke(key)
+
+def bearer_token():
+    auth_header = request.headers.get('Authorization')
+    if auth_header and auth_header.startswith('Bearer '):
+        return auth_header[7:]
+    return None
+
+def authenticate():
+    """(identity, error) for the current request, resolved once and kept on ``g``."""
+    if '_auth' not in g:
+        g._auth = resolve_credentials()
+    return g._auth
+
+def resolve_credentials():
+    if request.headers.get('X-Admin-Key') == ADMIN_KEY:
+        return {'user_id': 0, 'username': 'legacy_admin', 'role': 'admin'}, None
+    
+    token = bearer_token()
+    if not token:
+        return None, 'Authorization required'
+    
+    payload = verify_token(token)
+    if not payload:
+        return None, 'Invalid or expired token'
+    return payload, None
 
 def require_auth(f):
     @wraps(f)
     def decorated(*args, **kwargs):
-        auth_header = request.headers.get('Authorization')
-        admin_key = request.headers.get('X-Admin-Key')
-        
-        if admin_key == ADMIN_KEY:
-            g.current_user = {'user_id': 0, 'username': 'legacy_admin', 'role': 'admin'}
-            return f(*args, **kwargs)
-        
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return jsonify({'error': 'Authorization required'}), 401
-        
-        token = auth_header.split(' ')[1]
-        payload = verify_token(token)
+        identity, error = authenticate()
+        if identity is None:
+            return jsonify({'error': error}), 401
         
-        if not payload:
-            return jsonify({'error': 'Invalid or expired token'}), 401
-        
-        g.current_user = payload
+        g.current_user = identity
         return f(*args, **kwargs)
     return decorated
 
 def require_admin(f):
     @wraps(f)
     def decorated(*args, **kwargs):
-        auth_header = request.headers.get('Authorization')
-        admin_key = request.headers.get('X-Admin-Key')
+        identity, error = authenticate()
+        if identity is None:
+            return jsonify({'error': error}), 401
+        
+        if identity.get('role') != 'admin':
+            return jsonify({'error': 'Admin access required'}), 403
         
-        if admin_key == ADMIN_KEY:
-            g.current_user = {'user_id': 0, 'username': 'legacy_admin', 'role': 'admin'}
-            return f(*args, **kwargs)
+        g.current_user = identity
+        return f(*args, **kwargs)
+    return decorated
+
+def cached_response(*tags):
+    """Cache successful anonymous responses, tagged for invalidation.
+
+    Tags may reference view arguments, e.g. ``'post:{slug}'``, or be a
+    callable returning a list of tags for tags that depend on the query string.
+    Requests that carry credentials always bypass the cache since they can see
+    drafts.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            if request.headers.get('Authorization') or request.headers.get('X-Admin-Key'):
+                return f(*args, **kwargs)
+            
+            key = (request.path, tuple(sorted(request.args.items(multi=True))))
+            entry = response_cache.get(key)
+            if entry is not None:
+                body, mimetype = entry
+                response = app.response_class(body, mimetype=mimetype)
+                response.headers['X-Cache'] = 'HIT'
+                return response
+            
+            # Snapshot generations before querying so a concurrent write in
+            # another worker can't leave a stale entry looking fresh
+            entry_tags = []
+            for tag in tags:
+                entry_tags.extend(tag() if callable(tag) else [tag.format(**kwargs)])
+            stamp = response_cache.stamp(entry_tags)
+            
+            response = app.make_response(f(*args, **kwargs))
+            if response.status_code == 200:
+                response_cache.set(key, response.get_data(), response.mimetype, entry_tags, stamp)
+            response.headers['X-Cache'] = 'MISS'
+            return response
+        return decorated
+    return decorator
+
+def conditional_response(lookup):
+    """Answer If-None-Match / If-Modified-Since from a content version counter.
+
+    ``lookup`` receives the view arguments and returns a ``content_versions``
+    row (or None when the resource doesn't exist), so unchanged resources get a
+    304 without running the view's queries at all.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            if request.headers.get('Authorization') or request.headers.get('X-Admin-Key'):
+                return f(*args, **kwargs)
+            
+            row = lookup(get_db(), **kwargs)
+            if row is None:
+                return f(*args, **kwargs)
+            
+            etag = f'{row["scope"]}-{row["version"]}'
+            last_modified = parse_timestamp(row['updated_at'])
+            
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains_weak(etag)
+            else:
+                not_modified = bool(
+                    last_modified and request.if_modified_since
+                    and last_modified <= request.if_modified_since
+                )
+            
+            if not_modified:
+                response = app.response_class(status=304)
+            else:
+                response = app.make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            
+            response.set_etag(etag)
+            if last_modified:
+                response.last_modified = last_modified
+            response.cache_control.public = True
+            response.cache_control.no_cache = True
+            return response
+        return decorated
+    return decorator
+
+def parse_timestamp(value):
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+    except ValueError:
+        return None
+
+def posts_version(db, **kwargs):
+    return db.execute(
+        "SELECT scope, version, updated_at FROM content_versions WHERE scope = 'posts'"
+    ).fetchone()
+
+def post_version(db, slug):
+    return db.execute('''
+        SELECT v.scope, v.version, v.updated_at
+        FROM posts p
+        JOIN content_versions v ON v.scope = 'post:' || p.id
+        WHERE p.slug = ? AND p.published = 1
+    ''', (slug,)).fetchone()
+
+def comments_version(db, slug):
+    # Posts without comments have no row yet; report version 0 for them
+    return db.execute('''
+        SELECT 'comments:' || p.id AS scope,
+               coalesce(v.version, 0) AS version,
+               coalesce(v.updated_at, p.created_at) AS updated_at
+        FROM posts p
+        LEFT JOIN content_versions v ON v.scope = 'comments:' || p.id
+        WHERE p.slug = ?
+    ''', (slug,)).fetchone()
+
+def invalidate_post_caches(slug, categories=True):
+    post_count_cache.clear()
+    tags = ['posts', f'post:{slug}']
+    if categories:
+        tags.append('categories')
+    response_cache.invalidate(*tags)
+
+def write_comment_batch(comments):
+    """Insert queued comments in one transaction (runs on the write-behind thread).
+    
+    A comment whose post or parent was deleted while it waited is skipped.
+    """
+    if not write_lock.acquire(timeout=DB_ACQUIRE_TIMEOUT):
+        raise DatabaseBusy('Database is busy')
+    try:
+        db = writer_connection()
+        try:
+            db.executemany('''
+                INSERT INTO comments (post_id, parent_id, author_name, author_email, content, approved, created_at, pending_id)
+                SELECT :post_id, :parent_id, :author_name, :author_email, :content, 1, :created_at, :pending_id
+                WHERE EXISTS (SELECT 1 FROM posts WHERE id = :post_id)
+                AND (:parent_id IS NULL OR EXISTS (
+                    SELECT 1 FROM comments WHERE id = :parent_id AND post_id = :post_id
+                ))
+            ''', comments)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+    finally:
+        write_lock.release()
+    
+    comment_batch_size.observe(value=len(comments))
+    for slug in {comment['slug'] for comment in comments}:
+        invalidate_comment_caches(slug)
+
+def forget_dropped_comments(comments):
+    # Let a resubmission through instead of answering it as a duplicate of a lost comment
+    for comment in comments:
+        comment_duplicates.forget(comment['fingerprint'])
+
+comment_queue = WriteBehindQueue(write_comment_batch, COMMENT_BATCH_SIZE, COMMENT_QUEUE_SIZE,
+                                 on_drop=forget_dropped_comments)
+# Workers run atexit handlers on graceful shutdown; write out what is still queued
+atexit.register(comment_queue.flush, timeout=10)
+
+def render_static_batch(changes):
+    """Re-render changed posts, the list pages, sitemaps and feeds (runs on the write-behind thread).
+    
+    ``changes`` are ``(slug, post_id)`` pairs; a burst of edits is rendered
+    once per batch. ``('*', None)`` re-renders everything.
+    """
+    db = read_pool.acquire()
+    try:
+        changes = dict(changes)
+        rebuild = '*' in changes
+        changes.pop('*', None)
+        if rebuild:
+            for row in db.execute('SELECT slug, id FROM posts WHERE published = 1'):
+                changes[row['slug']] = row['id']
+            for slug in static_site.rendered_slugs() - set(changes):
+                changes[slug] = None
         
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return jsonify({'error': 'Authorization required'}), 401
+        for slug, post_id in changes.items():
+            post = db.execute('SELECT * FROM posts WHERE slug = ? AND published = 1', (slug,)).fetchone()
+            if post:
+                static_site.render_post(dict(post), parse_tags(post['tags']))
+                if prerender.renderable(slug):
+                    syndication.write_llms_entry(dict(post))
+                else:
+                    syndication.remove_llms_entry(post['id'])
+            else:
+                static_site.remove_post(slug)
+                if post_id is not None:
+                    syndication.remove_llms_entry(post_id)
         
-        token = auth_header.split(' ')[1]
-        payload = verify_token(token)
+        posts = [dict(post) for post in db.execute(f'''
+            SELECT {', '.join(POST_LIST_FIELDS)} FROM posts
+            WHERE published = 1 ORDER BY created_at DESC
+        ''')]
+        static_site.render_index(posts)
         
-        if not payload:
-            return jsonify({'error': 'Invalid or expired token'}), 401
+        # Only the shards holding changed posts are rewritten, unless rebuilding
+        shards = None if rebuild else {syndication.shard_for(post_id) for post_id in changes.values() if post_id}
+        syndication.write_sitemaps(posts, shards)
         
-        if payload.get('role') != 'admin':
-            return jsonify({'error': 'Admin access required'}), 403
+        # Feeds and llms-full.txt link to /blog/<slug>/, so they carry only posts with a page
+        feed_posts = (
+            dict(post) for post in db.execute('SELECT * FROM posts WHERE published = 1 ORDER BY created_at DESC')
+            if prerender.renderable(post['slug'])
+        )
+        syndication.write_feeds(list(itertools.islice(feed_posts, syndication.feed_size)))
         
-        g.current_user = payload
-        return f(*args, **kwargs)
-    return decorated
+        def load_post(post_id):
+            row = db.execute('SELECT * FROM posts WHERE id = ?', (post_id,)).fetchone()
+            return dict(row) if row else None
+        syndication.write_llms_full([post['id'] for post in posts if prerender.renderable(post['slug'])], load_post)
+    finally:
+        read_pool.release(db)
+
+static_queue = WriteBehindQueue(render_static_batch)
+atexit.register(static_queue.flush, timeout=10)
+
+def publish_static(slug, post_id=None):
+    try:
+        static_queue.submit(uuid.uuid4().hex, (slug, post_id))
+    except QueueFull:
+        app.logger.warning('Static render queue full; %s will be rendered on the next rebuild', slug)
+
+def invalidate_comment_caches(slug):
+    # Post responses carry comment_count, so they go stale along with the thread
+    response_cache.invalidate(f'comments:{slug}', 'posts', f'post:{slug}')
 
 def sanitize_html(text):
     allowed_tags = ['p', 'br', 'strong', 'em', 'ul', 'ol', 'li', 'h3', 'h4', 'a', 'blockquote']
     text = html.escape(text)
     return text
 
+def encode_cursor(created_at, post_id):
+    raw = json.dumps([created_at, post_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(value):
+    try:
+        raw = base64.urlsafe_b64decode(value + '=' * (-len(value) % 4))
+        created_at, post_id = json.loads(raw)
+        if not isinstance(created_at, str) or not isinstance(post_id, int):
+            return None
+        return created_at, post_id
+    except (ValueError, TypeError):
+        return None
+
+def parse_post_fields(value):
+    if not value:
+        return POST_LIST_FIELDS
+    
+    requested = [f.strip() for f in value.split(',') if f.strip()]
+    unknown = [f for f in requested if f not in POST_FIELDS]
+    if unknown:
+        return None
+    
+    # id and created_at back the keyset cursor, so they are always selected
+    return tuple(f for f in POST_FIELDS if f in requested or f in ('id', 'created_at'))
+
+def count_posts(db, where, params):
+    key = (where, tuple(params))
+    now = time.monotonic()
+    generation = response_cache.generations.get('posts')
+    cached = post_count_cache.get(key)
+    if cached and cached[1] > now and cached[2] == generation:
+        return cached[0]
+    
+    total = db.execute(f'SELECT COUNT(*) FROM posts{where}', params).fetchone()[0]
+    if len(post_count_cache) >= POST_COUNT_CACHE_SIZE:
+        post_count_cache.clear()
+    post_count_cache[key] = (total, now + POST_COUNT_TTL, generation)
+    return total
+
+def build_comment_tree(rows):
+    """Nest comments under their parents in a single pass.
+    
+    Rows may arrive in any order: a reply seen before its parent is parked on a
+    placeholder that the parent takes over when it shows up. Replies whose
+    parent is not in ``rows`` (e.g. still awaiting approval) are left out.
+    """
+    nodes = {}
+    roots = []
+    for row in rows:
+        comment = dict(row)
+        placeholder = nodes.get(comment['id'])
+        comment['replies'] = placeholder['replies'] if placeholder else []
+        nodes[comment['id']] = comment
+        
+        if comment['parent_id'] is None:
+            roots.append(comment)
+        else:
+            nodes.setdefault(comment['parent_id'], {'replies': []})['replies'].append(comment)
+    return roots
+
+def fetch_comment_page(db, post_id, per_page, position=None):
+    """One page of approved root comments for a post, with all their replies.
+    
+    Returns ``(comments, next_cursor)``. Paging by root keeps threads whole and
+    keeps the cost of a page independent of how many comments the post has.
+    """
+    conditions = ['post_id = ?', 'approved = 1', 'parent_id IS NULL']
+    params = [post_id]
+    if position:
+        conditions.append('(created_at, id) > (?, ?)')
+        params.extend(position)
+    
+    roots = db.execute(f'''
+        SELECT id, created_at FROM comments
+        WHERE {' AND '.join(conditions)}
+        ORDER BY created_at, id LIMIT ?
+    ''', params + [per_page + 1]).fetchall()
+    
+    next_cursor = None
+    if len(roots) > per_page:
+        roots = roots[:per_page]
+        next_cursor = encode_cursor(roots[-1]['created_at'], roots[-1]['id'])
+    if not roots:
+        return [], None
+    
+    placeholders = ', '.join('?' * len(roots))
+    rows = db.execute(f'''
+        WITH RECURSIVE thread (id) AS (
+            SELECT id FROM comments WHERE id IN ({placeholders})
+            UNION ALL
+            SELECT c.id FROM comments c JOIN thread t ON c.parent_id = t.id
+            WHERE c.approved = 1
+        )
+        SELECT c.id, c.post_id, c.parent_id, c.author_name, c.content, c.created_at
+        FROM comments c JOIN thread t ON c.id = t.id
+        ORDER BY c.created_at, c.id
+    ''', [root['id'] for root in roots]).fetchall()
+    
+    return build_comment_tree(rows), next_cursor
+
+def parse_comment_paging():
+    """(per_page, position) from the query string; position is False if the cursor is bad."""
+    per_page = request.args.get('per_page', COMMENTS_PER_PAGE, type=int)
+    per_page = max(1, min(per_page, COMMENTS_MAX_PER_PAGE))
+    cursor = request.args.get('cursor')
+    if not cursor:
+        return per_page, None
+    return per_page, decode_cursor(cursor) or False
+
+def batch_comment_tags():
+    slugs = request.args.get('posts', '').split(',')
+    return [f'comments:{slug.strip()}' for slug in slugs if slug.strip()]
+
+def strip_html(text):
+    if not text:
+        return ''
+    text = re.sub(r'<(script|style)\b.*?</\1\s*>', ' ', text, flags=re.IGNORECASE | re.DOTALL)
+    text = re.sub(r'<[^>]+>', ' ', text)
+    return re.sub(r'\s+', ' ', html.unescape(text)).strip()
+
+def build_search_query(q):
+    # Quote every term so user input can never be parsed as FTS5 syntax,
+    # and prefix-match the last one so results update while typing
+    terms = re.findall(r'\w+', q)[:SEARCH_MAX_TERMS]
+    if not terms:
+        return None
+    return ' '.join(f'"{term}"' for term in terms) + '*'
+
+def render_highlight(text):
+    # FTS5 wraps matches in control-character markers; escape everything else
+    # so the result is safe to drop into innerHTML
+    text = html.escape(text or '')
+    return text.replace(SEARCH_MARK_START, '<mark>').replace(SEARCH_MARK_END, '</mark>')
+
 def create_slug(title):
     slug = title.lower()
     slug = re.sub(r'[^a-z0-9\s-]', '', slug)
@@ -297,10 +1201,262 @@ def create_slug(title):
     slug = re.sub(r'-+', '-', slug)
     return slug.strip('-')
 
+def upload_too_large():
+    return UploadRejected(f'File too large. Maximum size: {MAX_UPLOAD_SIZE // (1024*1024)}MB', 413)
+
+def copy_upload(stream, out, offset=0, limit=None, digest=None):
+    """Copy an upload body to ``out`` UPLOAD_CHUNK_SIZE bytes at a time.
+    
+    A body starting at offset 0 must begin with the magic bytes of an allowed
+    image type, and the total may not pass ``limit``. Both are checked as the
+    data arrives, so a bad upload is rejected without reading the rest of it.
+    Returns the number of bytes written.
+    """
+    limit = MAX_UPLOAD_SIZE if limit is None else limit
+    written = 0
+    head = b''
+    while True:
+        chunk = stream.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        if offset + written + len(chunk) > limit:
+            if limit < MAX_UPLOAD_SIZE:
+                raise UploadRejected('Upload is larger than its declared size')
+            raise upload_too_large()
+        
+        if offset == 0 and len(head) < images.SNIFF_BYTES:
+            head += chunk[:images.SNIFF_BYTES]
+            if len(head) >= images.SNIFF_BYTES and not images.sniff_type(head):
+                raise UploadRejected('File content is not a JPG, PNG, WebP or GIF image')
+        
+        if digest is not None:
+            digest.update(chunk)
+        out.write(chunk)
+        written += len(chunk)
+    
+    if offset == 0 and len(head) < images.SNIFF_BYTES and not images.sniff_type(head):
+        raise UploadRejected('File content is not a JPG, PNG, WebP or GIF image')
+    return written
+
+class MultipartUpload:
+    """The ``file`` part of a multipart/form-data body, decoded as it is read.
+    
+    Other fields are skipped without being kept and the body is never spooled:
+    ``read`` hands copy_upload the file's bytes as they arrive, so the same
+    signature and size checks stop a bad upload early. ``filename`` is None
+    if the body has no file part.
+    """
+    
+    def __init__(self, stream, boundary, field='file'):
+        self.stream = stream
+        self.decoder = MultipartDecoder(boundary.encode('latin-1'), max_form_memory_size=2 * UPLOAD_CHUNK_SIZE)
+        self.filename = None
+        self.done = False
+        while self.filename is None and not self.done:
+            event = self.next_event()
+            if isinstance(event, File) and event.name == field:
+                self.filename = event.filename
+            elif isinstance(event, Epilogue):
+                self.done = True
+    
+    def next_event(self):
+        while True:
+            try:
+                event = self.decoder.next_event()
+            except ValueError:
+                raise UploadRejected('Malformed multipart body')
+            if event is not NEED_DATA:
+                return event
+            self.decoder.receive_data(self.stream.read(UPLOAD_CHUNK_SIZE) or None)
+    
+    def read(self, size=-1):
+        while not self.done:
+            event = self.next_event()
+            if isinstance(event, Data):
+                self.done = not event.more_data
+                if event.data:
+                    return event.data
+        return b''
+
+def store_upload(stream):
+    """Stream an upload to disk and store it under its content hash.
+    
+    The SHA-256 is computed while the body is copied, so identical files end
+    up under the same name and are stored once. Returns the filename.
+    """
+    digest = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=UPLOAD_DIR, prefix='.upload-')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            copy_upload(stream, out, digest=digest)
+        return commit_upload(tmp_path, digest)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def commit_upload(tmp_path, digest):
+    """Move a complete upload to ``<sha256>.<ext>``, reusing an identical file."""
+    with open(tmp_path, 'rb') as f:
+        ext = images.sniff_type(f.read(images.SNIFF_BYTES))
+    if not ext:
+        raise UploadRejected('File content is not a JPG, PNG, WebP or GIF image')
+    try:
+        images.image_size(tmp_path)
+    except images.ImageTooLarge:
+        raise UploadRejected('Image dimensions are too large', 415)
+    
+    filename = f'{digest.hexdigest()}.{ext}'
+    path = os.path.join(UPLOAD_DIR, filename)
+    if os.path.exists(path):
+        # Already stored; touching it restarts the garbage collection grace period
+        os.utime(path)
+        os.remove(tmp_path)
+    else:
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    return filename
+
+def upload_session_paths(session_id):
+    if not re.fullmatch(r'[0-9a-f]{32}', session_id):
+        return None
+    base = os.path.join(UPLOAD_SESSION_DIR, session_id)
+    if not os.path.exists(base + '.json'):
+        return None
+    return base + '.json', base + '.part'
+
+def upload_result(filename):
+    """Response body for a stored upload: its URL plus srcset data for images."""
+    path = os.path.join(UPLOAD_DIR, filename)
+    url = f'/api/uploads/{filename}'
+    result = {'url': url}
+    
+    # Variants render in the background; their URLs work before they are ready
+    size = images.image_size(path)
+    manifest = image_pipeline.manifest(filename, url, size)
+    if manifest:
+        image_pipeline.generate_all(filename, size[0] if size else None)
+        result.update(manifest)
+    return result
+
+def send_upload(filename, variant=False):
+    """Immutable response for an upload or one of its variants.
+    
+    When UPLOAD_ACCEL_PREFIX is set and the request came through nginx, the
+    body is left out: X-Accel-Redirect names the file and nginx sends it from
+    the shared volume, so the worker is free as soon as the headers are out.
+    """
+    directory = VARIANT_DIR if variant else UPLOAD_DIR
+    mimetype = images.mimetype_for(filename)
+    
+    if UPLOAD_ACCEL_PREFIX and request.headers.get('X-Sendfile-Type') == 'X-Accel-Redirect':
+        response = app.response_class(mimetype=mimetype)
+        location = f'variants/{filename}' if variant else filename
+        response.headers['X-Accel-Redirect'] = UPLOAD_ACCEL_PREFIX.rstrip('/') + '/' + location
+        return response
+    
+    response = send_from_directory(directory, filename, mimetype=mimetype, max_age=UPLOAD_MAX_AGE)
+    response.cache_control.immutable = True
+    return response
+
+def is_admin_request():
+    identity, _ = authenticate()
+    return bool(identity and identity.get('role') == 'admin')
+
+@app.before_request
+def start_request_metrics():
+    request_stats.current = {'start': time.perf_counter(), 'queries': 0, 'query_time': 0.0}
+    
+    # Admins can profile a single request with ?__profile=1; PROFILE_REQUESTS
+    # samples a fraction of all requests and keeps only the slow ones
+    forced = request.args.get('__profile') == '1' and is_admin_request()
+    if forced or (PROFILE_REQUESTS and random.random() < PROFILE_SAMPLE_RATE):
+        profiler = cProfile.Profile()
+        g._profile = (profiler, forced, time.perf_counter())
+        profiler.enable()
+
+@app.after_request
+def record_request_metrics(response):
+    stats = getattr(request_stats, 'current', None)
+    request_stats.current = None
+    if stats is None:
+        return response
+    
+    duration = time.perf_counter() - stats['start']
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    
+    requests_total.inc(route, request.method, str(response.status_code))
+    request_duration.observe(route, request.method, value=duration)
+    response_bytes.inc(route, amount=response.content_length or 0)
+    db_queries.observe(route, value=stats['queries'])
+    db_query_seconds.inc(route, amount=stats['query_time'])
+    if 'X-Cache' in response.headers:
+        cache_requests.inc(route, response.headers['X-Cache'].lower())
+    
+    response.headers['Server-Timing'] = (
+        f'db;desc="{stats["queries"]} queries";dur={stats["query_time"] * 1000:.1f}, '
+        f'total;dur={duration * 1000:.1f}'
+    )
+    
+    # The profile itself is written in finish_request_profile; name it now so
+    # a forced profile can point at its file
+    profile = g.get('_profile')
+    if profile and profile[1]:
+        g._profile_path = profile_path(route, duration)
+        response.headers['X-Profile'] = os.path.basename(g._profile_path)
+    
+    return response
+
+@app.teardown_request
+def finish_request_profile(exception):
+    # Teardown also runs when an unhandled exception skips after_request, so
+    # the profiler never stays attached to the worker thread
+    profile = g.pop('_profile', None)
+    if profile is None:
+        return
+    
+    profiler, forced, started = profile
+    profiler.disable()
+    duration = time.perf_counter() - started
+    path = g.pop('_profile_path', None)
+    if path is None and (forced or duration * 1000 >= PROFILE_SLOW_MS):
+        path = profile_path(request.url_rule.rule if request.url_rule else 'unmatched', duration)
+    if path:
+        profiler.dump_stats(path)
+
+def profile_path(route, duration):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    name = re.sub(r'[^A-Za-z0-9]+', '_', route).strip('_') or 'root'
+    filename = f'{datetime.utcnow():%Y%m%dT%H%M%S}-{request.method}-{name}-{int(duration * 1000)}ms-{os.getpid()}.pstats'
+    return os.path.join(PROFILE_DIR, filename)
+
 @app.route('/health')
 def health():
     return jsonify({'status': 'healthy', 'service': 'blog-api'})
 
+@app.route('/metrics')
+def metrics_endpoint():
+    if METRICS_TOKEN and request.headers.get('Authorization') != f'Bearer {METRICS_TOKEN}':
+        return jsonify({'error': 'Authorization required'}), 401
+    
+    stats = response_cache.stats()
+    cache_hits.set(value=stats['hits'])
+    cache_misses.set(value=stats['misses'])
+    cache_entries.set(value=stats['entries'])
+    comment_queue_depth.set(value=comment_queue.depth())
+    
+    return app.response_class(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+def login_throttled(account):
+    """429 response if this client or account is out of attempts, checked before any hashing."""
+    for limiter, key in ((login_ip_limiter, request.remote_addr), (login_account_limiter, account)):
+        allowed, retry_after = limiter.allow(key)
+        if not allowed:
+            login_attempts.inc('throttled')
+            response = jsonify({'error': 'Too many login attempts, please wait and try again'})
+            response.headers['Retry-After'] = str(max(1, int(retry_after + 0.5)))
+            return response, 429
+    return None
 
 @app.route('/api/auth/login', methods=['POST'])
 def login():
@@ -315,6 +1471,10 @@ def login():
     if not username or not password:
         return jsonify({'error': 'Username and password are required'}), 400
     
+    throttled = login_throttled(username.lower())
+    if throttled:
+        return throttled
+    
     db = get_db()
     user = db.execute(
         'SELECT * FROM users WHERE username = ? OR email = ?',
@@ -322,14 +1482,27 @@ def login():
     ).fetchone()
     
     if not user:
+        # Hash anyway, so response time doesn't reveal which usernames exist
+        password_hasher.check_unknown(password)
+        login_attempts.inc('failed')
         return jsonify({'error': 'Invalid credentials'}), 401
     
-    if not bcrypt.checkpw(password.encode('utf-8'), user['password_hash'].encode('utf-8')):
+    if not password_hasher.check(password, user['password_hash']):
+        login_attempts.inc('failed')
         return jsonify({'error': 'Invalid credentials'}), 401
     
+    login_attempts.inc('success')
+    login_account_limiter.reset(username.lower())
+    
+    # Upgrade hashes made with an older cost while the plaintext is at hand
+    password_hash = user['password_hash']
+    if password_hasher.needs_rehash(password_hash):
+        password_hash = password_hasher.hash(password)
+    
+    db = get_write_db()
     db.execute(
-        'UPDATE users SET last_login = CURRENT_TIMESTAMP WHERE id = ?',
-        (user['id'],)
+        'UPDATE users SET last_login = CURRENT_TIMESTAMP, password_hash = ? WHERE id = ?',
+        (password_hash, user['id'])
     )
     db.commit()
     
@@ -372,6 +1545,16 @@ def refresh_token():
         }
     })
 
+@app.route('/api/auth/logout', methods=['POST'])
+@require_auth
+def logout():
+    # The legacy admin key has nothing to revoke; tokens stay revoked until they expire
+    token = bearer_token()
+    if token and 'exp' in g.current_user:
+        revoke_token(token, g.current_user['exp'])
+    
+    return jsonify({'message': 'Logged out'})
+
 @app.route('/api/auth/change-password', methods=['POST'])
 @require_auth
 def change_password():
@@ -389,6 +1572,10 @@ def change_password():
     if len(new_password) < 8:
         return jsonify({'error': 'New password must be at least 8 characters'}), 400
     
+    throttled = login_throttled(f"user:{g.current_user['user_id']}")
+    if throttled:
+        return throttled
+    
     db = get_db()
     user = db.execute(
         'SELECT * FROM users WHERE id = ?',
@@ -398,11 +1585,13 @@ def change_password():
     if not user:
         return jsonify({'error': 'User not found'}), 404
     
-    if not bcrypt.checkpw(current_password.encode('utf-8'), user['password_hash'].encode('utf-8')):
+    if not password_hasher.check(current_password, user['password_hash']):
+        login_attempts.inc('failed')
         return jsonify({'error': 'Current password is incorrect'}), 401
     
-    new_hash = bcrypt.hashpw(new_password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    new_hash = password_hasher.hash(new_password)
     
+    db = get_write_db()
     db.execute(
         'UPDATE users SET password_hash = ? WHERE id = ?',
         (new_hash, user['id'])
@@ -413,6 +1602,8 @@ def change_password():
 
 
 @app.route('/api/posts', methods=['GET'])
+@conditional_response(posts_version)
+@cached_response('posts')
 def get_posts():
     db = get_db()
     
@@ -420,76 +1611,95 @@ def get_posts():
     per_page = request.args.get('per_page', 10, type=int)
     category = request.args.get('category')
     tag = request.args.get('tag')
+    cursor = request.args.get('cursor')
+    fields = parse_post_fields(request.args.get('fields'))
     include_unpublished = request.args.get('include_unpublished', 'false').lower() == 'true'
     
-    per_page = min(per_page, 50)
-    offset = (page - 1) * per_page
+    # Keyset mode skips the total by default; page mode keeps it for page links
+    default_total = 'false' if cursor is not None else 'true'
+    include_total = request.args.get('include_total', default_total).lower() == 'true'
+    
+    per_page = max(1, min(per_page, 50))
+    page = max(1, page)
+    
+    if fields is None:
+        return jsonify({'error': f'Unknown field. Allowed: {", ".join(POST_FIELDS)}'}), 400
     
     if include_unpublished:
-        auth_header = request.headers.get('Authorization')
-        admin_key = request.headers.get('X-Admin-Key')
-        
-        is_admin = False
-        if admin_key == ADMIN_KEY:
-            is_admin = True
-        elif auth_header and auth_header.startswith('Bearer '):
-            token = auth_header.split(' ')[1]
-            payload = verify_token(token)
-            if payload and payload.get('role') == 'admin':
-                is_admin = True
-        
-        if not is_admin:
+        if not is_admin_request():
             include_unpublished = False
     
-    query = 'SELECT * FROM posts'
+    conditions = []
     params = []
     
     if not include_unpublished:
-        query += ' WHERE published = 1'
+        conditions.append('published = 1')
     
     if category:
-        query += ' AND category = ?' if 'WHERE' in query else ' WHERE category = ?'
+        conditions.append('category = ?')
         params.append(category)
     
     if tag:
-        query += ' AND tags LIKE ?' if 'WHERE' in query else ' WHERE tags LIKE ?'
-        params.append(f'%{tag}%')
-    
-    count_query = query.replace('SELECT *', 'SELECT COUNT(*)')
-    total = db.execute(count_query, params).fetchone()[0]
-    
-    query += ' ORDER BY created_at DESC LIMIT ? OFFSET ?'
-    params.extend([per_page, offset])
-    
-    posts = db.execute(query, params).fetchall()
+        conditions.append('id IN (SELECT post_id FROM post_tags WHERE tag = ?)')
+        params.append(tag.strip())
+    
+    where = ' WHERE ' + ' AND '.join(conditions) if conditions else ''
+    total = count_posts(db, where, params) if include_total else None
+    
+    page_conditions = list(conditions)
+    page_params = list(params)
+    
+    if cursor:
+        position = decode_cursor(cursor)
+        if not position:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        page_conditions.append('(created_at, id) < (?, ?)')
+        page_params.extend(position)
+    
+    query = f'SELECT {", ".join(fields)} FROM posts'
+    if page_conditions:
+        query += ' WHERE ' + ' AND '.join(page_conditions)
+    
+    # Fetch one extra row to learn whether another page exists without counting
+    query += ' ORDER BY created_at DESC, id DESC LIMIT ?'
+    page_params.append(per_page + 1)
+    
+    if cursor is None:
+        query += ' OFFSET ?'
+        page_params.append((page - 1) * per_page)
+    
+    posts = db.execute(query, page_params).fetchall()
+    has_more = len(posts) > per_page
+    posts = posts[:per_page]
+    
+    next_cursor = None
+    if has_more:
+        last = posts[-1]
+        next_cursor = encode_cursor(last['created_at'], last['id'])
+    
+    pagination = {
+        'per_page': per_page,
+        'has_more': has_more,
+        'next_cursor': next_cursor
+    }
+    if cursor is None:
+        pagination['page'] = page
+    if total is not None:
+        pagination['total'] = total
+        pagination['pages'] = (total + per_page - 1) // per_page
     
     return jsonify({
         'posts': [dict(post) for post in posts],
-        'pagination': {
-            'page': page,
-            'per_page': per_page,
-            'total': total,
-            'pages': (total + per_page - 1) // per_page
-        }
+        'pagination': pagination
     })
 
 @app.route('/api/posts/<slug>', methods=['GET'])
+@conditional_response(post_version)
+@cached_response('post:{slug}')
 def get_post(slug):
     db = get_db()
     
-    auth_header = request.headers.get('Authorization')
-    admin_key = request.headers.get('X-Admin-Key')
-    
-    is_admin = False
-    if admin_key == ADMIN_KEY:
-        is_admin = True
-    elif auth_header and auth_header.startswith('Bearer '):
-        token = auth_header.split(' ')[1]
-        payload = verify_token(token)
-        if payload and payload.get('role') == 'admin':
-            is_admin = True
-    
-    if is_admin:
+    if is_admin_request():
         post = db.execute('SELECT * FROM posts WHERE slug = ?', (slug,)).fetchone()
     else:
         post = db.execute(
@@ -510,7 +1720,7 @@ def create_post():
     if not data or not data.get('title') or not data.get('content'):
         return jsonify({'error': 'Title and content are required'}), 400
     
-    db = get_db()
+    db = get_write_db()
     
     slug = data.get('slug') or create_slug(data['title'])
     
@@ -533,7 +1743,11 @@ def create_post():
             data.get('featured_image', ''),
             data.get('published', True)
         ))
+        sync_post_tags(db, cursor.lastrowid, data.get('tags', ''))
+        sync_upload_refs(db, cursor.lastrowid, data['content'], data.get('featured_image', ''))
         db.commit()
+        invalidate_post_caches(slug)
+        publish_static(slug, cursor.lastrowid)
         
         post = db.execute('SELECT * FROM posts WHERE id = ?', (cursor.lastrowid,)).fetchone()
         return jsonify(dict(post)), 201
@@ -544,7 +1758,7 @@ def create_post():
 @require_admin
 def update_post(slug):
     data = request.get_json()
-    db = get_db()
+    db = get_write_db()
     
     post = db.execute('SELECT * FROM posts WHERE slug = ?', (slug,)).fetchone()
     if not post:
@@ -568,7 +1782,20 @@ def update_post(slug):
             data.get('published', post['published']),
             slug
         ))
+        if 'tags' in data:
+            sync_post_tags(db, post['id'], data['tags'])
+        if 'content' in data or 'featured_image' in data:
+            sync_upload_refs(
+                db, post['id'],
+                data.get('content', post['content']),
+                data.get('featured_image', post['featured_image'])
+            )
         db.commit()
+        invalidate_post_caches(
+            slug,
+            categories='category' in data or 'published' in data
+        )
+        publish_static(slug, post['id'])
         
         updated_post = db.execute('SELECT * FROM posts WHERE slug = ?', (slug,)).fetchone()
         return jsonify(dict(updated_post))
@@ -578,20 +1805,27 @@ def update_post(slug):
 @app.route('/api/posts/<slug>', methods=['DELETE'])
 @require_admin
 def delete_post(slug):
-    db = get_db()
+    db = get_write_db()
     
     post = db.execute('SELECT * FROM posts WHERE slug = ?', (slug,)).fetchone()
     if not post:
         return jsonify({'error': 'Post not found'}), 404
     
     try:
+        db.execute('DELETE FROM post_tags WHERE post_id = ?', (post['id'],))
+        db.execute('DELETE FROM upload_refs WHERE post_id = ?', (post['id'],))
         db.execute('DELETE FROM posts WHERE slug = ?', (slug,))
         db.commit()
+        invalidate_post_caches(slug)
+        response_cache.invalidate(f'comments:{slug}')
+        publish_static(slug, post['id'])
         return jsonify({'message': 'Post deleted successfully'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/categories', methods=['GET'])
+@conditional_response(posts_version)
+@cached_response('categories')
 def get_categories():
     db = get_db()
     categories = db.execute('''
@@ -604,42 +1838,144 @@ def get_categories():
     
     return jsonify([dict(cat) for cat in categories])
 
+@app.route('/api/tags', methods=['GET'])
+@conditional_response(posts_version)
+@cached_response('posts')
+def get_tags():
+    db = get_db()
+    tags = db.execute('''
+        SELECT pt.tag, COUNT(*) as count
+        FROM post_tags pt
+        JOIN posts p ON p.id = pt.post_id
+        WHERE p.published = 1
+        GROUP BY pt.tag
+        ORDER BY count DESC, pt.tag
+    ''').fetchall()
+    
+    return jsonify([dict(tag) for tag in tags])
+
+
+@app.route('/api/search', methods=['GET'])
+@conditional_response(posts_version)
+@cached_response('posts')
+def search_posts():
+    q = request.args.get('q', '').strip()
+    page = max(1, request.args.get('page', 1, type=int))
+    per_page = max(1, min(request.args.get('per_page', 10, type=int), 50))
+    include_total = request.args.get('include_total', 'true').lower() == 'true'
+    
+    if not q:
+        return jsonify({'error': 'Search query is required'}), 400
+    
+    match = build_search_query(q)
+    if not match:
+        return jsonify({'query': q, 'results': [], 'pagination': {
+            'page': page, 'per_page': per_page, 'has_more': False, 'total': 0, 'pages': 0
+        }})
+    
+    db = get_db()
+    
+    # Title matches weigh most, then tags, excerpt and body
+    rows = db.execute('''
+        SELECT p.id, p.title, p.slug, p.excerpt, p.author, p.category, p.tags,
+               p.featured_image, p.created_at,
+               highlight(posts_fts, 0, ?, ?) AS title_highlight,
+               snippet(posts_fts, 2, ?, ?, '…', 24) AS snippet
+        FROM posts_fts
+        JOIN posts p ON p.id = posts_fts.rowid
+        WHERE posts_fts MATCH ? AND p.published = 1
+        ORDER BY bm25(posts_fts, 10.0, 3.0, 1.0, 5.0)
+        LIMIT ? OFFSET ?
+    ''', (
+        SEARCH_MARK_START, SEARCH_MARK_END,
+        SEARCH_MARK_START, SEARCH_MARK_END,
+        match, per_page + 1, (page - 1) * per_page
+    )).fetchall()
+    
+    has_more = len(rows) > per_page
+    results = []
+    for row in rows[:per_page]:
+        result = dict(row)
+        result['title_highlight'] = render_highlight(result['title_highlight'])
+        result['snippet'] = render_highlight(result['snippet'])
+        results.append(result)
+    
+    pagination = {'page': page, 'per_page': per_page, 'has_more': has_more}
+    if include_total:
+        total = db.execute('''
+            SELECT COUNT(*) FROM posts_fts
+            JOIN posts p ON p.id = posts_fts.rowid
+            WHERE posts_fts MATCH ? AND p.published = 1
+        ''', (match,)).fetchone()[0]
+        pagination['total'] = total
+        pagination['pages'] = (total + per_page - 1) // per_page
+    
+    return jsonify({'query': q, 'results': results, 'pagination': pagination})
+
 
 @app.route('/api/posts/<slug>/comments', methods=['GET'])
+@conditional_response(comments_version)
+@cached_response('comments:{slug}')
 def get_comments(slug):
     db = get_db()
     
-    post = db.execute('SELECT id FROM posts WHERE slug = ?', (slug,)).fetchone()
+    post = db.execute('SELECT id, comment_count FROM posts WHERE slug = ?', (slug,)).fetchone()
     if not post:
         return jsonify({'error': 'Post not found'}), 404
     
-    comments = db.execute('''
-        SELECT id, post_id, parent_id, author_name, content, created_at
-        FROM comments 
-        WHERE post_id = ? AND approved = 1
-        ORDER BY created_at ASC
-    ''', (post['id'],)).fetchall()
-    
-    comment_dict = {}
-    root_comments = []
+    per_page, position = parse_comment_paging()
+    if position is False:
+        return jsonify({'error': 'Invalid cursor'}), 400
     
-    for comment in comments:
-        c = dict(comment)
-        c['replies'] = []
-        comment_dict[c['id']] = c
-        
-        if c['parent_id'] is None:
-            root_comments.append(c)
-        else:
-            parent = comment_dict.get(c['parent_id'])
-            if parent:
-                parent['replies'].append(c)
+    comments, next_cursor = fetch_comment_page(db, post['id'], per_page, position)
     
     return jsonify({
-        'comments': root_comments,
-        'total': len(comments)
+        'comments': comments,
+        'total': post['comment_count'],
+        'pagination': {
+            'per_page': per_page,
+            'has_more': next_cursor is not None,
+            'next_cursor': next_cursor
+        }
     })
 
+@app.route('/api/comments', methods=['GET'])
+@cached_response(batch_comment_tags)
+def get_comments_batch():
+    """First page of comments for several posts: ``?posts=slug-a,slug-b``.
+    
+    Further pages come from ``/api/posts/<slug>/comments?cursor=...``.
+    """
+    slugs = list(dict.fromkeys(tag.split(':', 1)[1] for tag in batch_comment_tags()))
+    if not slugs:
+        return jsonify({'error': 'posts parameter is required'}), 400
+    if len(slugs) > COMMENTS_BATCH_MAX_POSTS:
+        return jsonify({'error': f'Too many posts (max {COMMENTS_BATCH_MAX_POSTS})'}), 400
+    
+    per_page, _ = parse_comment_paging()
+    db = get_db()
+    
+    placeholders = ', '.join('?' * len(slugs))
+    posts = db.execute(
+        f'SELECT id, slug, comment_count FROM posts WHERE slug IN ({placeholders})',
+        slugs
+    ).fetchall()
+    
+    results = {}
+    for post in posts:
+        comments, next_cursor = fetch_comment_page(db, post['id'], per_page)
+        results[post['slug']] = {
+            'comments': comments,
+            'total': post['comment_count'],
+            'pagination': {
+                'per_page': per_page,
+                'has_more': next_cursor is not None,
+                'next_cursor': next_cursor
+            }
+        }
+    
+    return jsonify({'posts': results})
+
 @app.route('/api/posts/<slug>/comments', methods=['POST'])
 def create_comment(slug):
     data = request.get_json()
@@ -663,6 +1999,14 @@ def create_comment(slug):
     if len(author_name) > 100:
         return jsonify({'error': 'Name too long (max 100 characters)'}), 400
     
+    for limiter, key in ((comment_ip_limiter, request.remote_addr), (comment_email_limiter, author_email.lower())):
+        allowed, retry_after = limiter.allow(key)
+        if not allowed:
+            comments_rejected.inc('rate_limited')
+            response = jsonify({'error': 'Too many comments, please wait before posting again'})
+            response.headers['Retry-After'] = str(max(1, int(retry_after + 0.5)))
+            return response, 429
+    
     db = get_db()
     
     post = db.execute('SELECT id FROM posts WHERE slug = ? AND published = 1', (slug,)).fetchone()
@@ -678,38 +2022,78 @@ def create_comment(slug):
         ).fetchone()
         if not parent:
             return jsonify({'error': 'Parent comment not found'}), 404
+    else:
+        parent_id = None
+    
+    comment = {
+        'pending_id': uuid.uuid4().hex,
+        'post_id': post['id'],
+        'parent_id': parent_id,
+        'author_name': author_name,
+        'content': content,
+        'created_at': datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+    }
     
-    try:
-        cursor = db.execute('''
-            INSERT INTO comments (post_id, parent_id, author_name, author_email, content, approved)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (post['id'], parent_id, author_name, author_email, content, True))
-        db.commit()
-        
-        comment = db.execute('''
-            SELECT id, post_id, parent_id, author_name, content, created_at
-            FROM comments WHERE id = ?
-        ''', (cursor.lastrowid,)).fetchone()
-        
-        result = dict(comment)
-        result['replies'] = []
-        
-        return jsonify(result), 201
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    # The same comment posted again (double submit, retry, spam run) gets the
+    # original pending ID back instead of a second row
+    fingerprint = hashlib.sha256(
+        '\x00'.join((str(post['id']), author_email.lower(), ' '.join(content.split()))).encode('utf-8')
+    ).hexdigest()
+    duplicate_of = comment_duplicates.check(fingerprint, comment['pending_id'])
+    if duplicate_of:
+        comments_rejected.inc('duplicate')
+        comment['pending_id'] = duplicate_of
+    else:
+        try:
+            comment_queue.submit(comment['pending_id'], dict(comment, author_email=author_email, slug=slug, fingerprint=fingerprint))
+        except QueueFull:
+            comment_duplicates.forget(fingerprint)
+            comments_rejected.inc('queue_full')
+            response = jsonify({'error': 'Service busy, please retry'})
+            response.headers['Retry-After'] = '1'
+            return response, 503
+    
+    response = jsonify({
+        'status': 'pending',
+        'pending_id': comment['pending_id'],
+        'comment': dict(comment, replies=[])
+    })
+    response.headers['Location'] = f'/api/comments/pending/{comment["pending_id"]}'
+    return response, 202
+
+@app.route('/api/comments/pending/<pending_id>', methods=['GET'])
+def get_pending_comment(pending_id):
+    comment = get_db().execute('''
+        SELECT id, post_id, parent_id, author_name, content, created_at
+        FROM comments WHERE pending_id = ?
+    ''', (pending_id,)).fetchone()
+    if comment:
+        return jsonify({'status': 'stored', 'comment': dict(comment, replies=[])})
+    
+    if not re.fullmatch(r'[0-9a-f]{32}', pending_id):
+        return jsonify({'error': 'Pending comment not found'}), 404
+    
+    # Not written yet. It may be queued in another worker, which this one
+    # can't see, so any well-formed ID is reported as pending
+    return jsonify({'status': 'pending'}), 202
 
 @app.route('/api/comments/<int:comment_id>', methods=['DELETE'])
 @require_admin
 def delete_comment(comment_id):
-    db = get_db()
+    db = get_write_db()
     
-    comment = db.execute('SELECT * FROM comments WHERE id = ?', (comment_id,)).fetchone()
+    comment = db.execute('''
+        SELECT c.*, p.slug FROM comments c
+        LEFT JOIN posts p ON p.id = c.post_id
+        WHERE c.id = ?
+    ''', (comment_id,)).fetchone()
     if not comment:
         return jsonify({'error': 'Comment not found'}), 404
     
     try:
         db.execute('DELETE FROM comments WHERE id = ?', (comment_id,))
         db.commit()
+        invalidate_comment_caches(comment['slug'])
         return jsonify({'message': 'Comment deleted successfully'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -717,39 +2101,244 @@ def delete_comment(comment_id):
 @app.route('/api/comments/<int:comment_id>/approve', methods=['POST'])
 @require_admin
 def approve_comment(comment_id):
-    db = get_db()
+    db = get_write_db()
+    
+    post = db.execute('''
+        SELECT p.slug FROM comments c
+        JOIN posts p ON p.id = c.post_id
+        WHERE c.id = ?
+    ''', (comment_id,)).fetchone()
     
     try:
         db.execute('UPDATE comments SET approved = 1 WHERE id = ?', (comment_id,))
         db.commit()
+        if post:
+            invalidate_comment_caches(post['slug'])
         return jsonify({'message': 'Comment approved'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/cache/stats', methods=['GET'])
+@require_admin
+def cache_stats():
+    return jsonify(response_cache.stats())
+
+@app.route('/api/static/rebuild', methods=['POST'])
+@require_admin
+def rebuild_static():
+    publish_static('*')
+    if request.args.get('wait', 'false').lower() == 'true' and static_queue.flush(timeout=60):
+        return jsonify({'status': 'rendered', 'output_dir': STATIC_DIR})
+    return jsonify({'status': 'queued', 'output_dir': STATIC_DIR}), 202
+
+@app.route('/api/uploads/gc', methods=['POST'])
+@require_admin
+def collect_uploads():
+    dry_run = request.args.get('dry_run', 'false').lower() == 'true'
+    grace = request.args.get('grace', UPLOAD_GC_GRACE, type=int)
+    
+    db = get_write_db()
+    # Hold the write lock while scanning so no post can start referencing a file
+    # between reading upload_refs and deleting it
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        referenced = {row[0] for row in db.execute('SELECT DISTINCT filename FROM upload_refs')}
+        cutoff = time.time() - max(grace, 0)
+        # Uploads still streaming to a .upload-* temp file or into a session
+        # keep a floor, so ?grace=0 only reaches abandoned ones
+        partial_cutoff = time.time() - max(grace, UPLOAD_GC_MIN_GRACE)
+        removed = []
+        freed = 0
+        kept_hashes = set()
+        removed_hashes = set()
+        
+        with os.scandir(UPLOAD_DIR) as entries:
+            for entry in entries:
+                if not entry.is_file():
+                    continue
+                content_hash = entry.name.split('.', 1)[0]
+                if entry.name in referenced:
+                    kept_hashes.add(content_hash)
+                    continue
+                stat = entry.stat()
+                if stat.st_mtime > (partial_cutoff if entry.name.startswith('.') else cutoff):
+                    kept_hashes.add(content_hash)
+                    continue
+                
+                removed.append(entry.name)
+                removed_hashes.add(content_hash)
+                freed += stat.st_size
+                if not dry_run:
+                    os.remove(entry.path)
+        
+        # Variants of the originals removed above, and any left behind by an
+        # original that is already gone. Orphans get the in-progress floor, as
+        # one may belong to an upload stored since UPLOAD_DIR was scanned.
+        if os.path.isdir(VARIANT_DIR):
+            with os.scandir(VARIANT_DIR) as entries:
+                for entry in entries:
+                    content_hash = entry.name.split('.', 1)[0].split('-', 1)[0]
+                    if not entry.is_file() or content_hash in kept_hashes:
+                        continue
+                    stat = entry.stat()
+                    if content_hash not in removed_hashes and stat.st_mtime > partial_cutoff:
+                        continue
+                    
+                    removed.append(f'variants/{entry.name}')
+                    freed += stat.st_size
+                    if not dry_run:
+                        os.remove(entry.path)
+        
+        # Resumable uploads that stopped receiving chunks
+        if os.path.isdir(UPLOAD_SESSION_DIR):
+            with os.scandir(UPLOAD_SESSION_DIR) as entries:
+                for entry in entries:
+                    if not entry.name.endswith('.part'):
+                        continue
+                    stat = entry.stat()
+                    if stat.st_mtime > partial_cutoff:
+                        continue
+                    
+                    removed.append(f'sessions/{entry.name}')
+                    freed += stat.st_size
+                    if not dry_run:
+                        os.remove(entry.path)
+                        meta_path = entry.path[:-len('.part')] + '.json'
+                        if os.path.exists(meta_path):
+                            os.remove(meta_path)
+    finally:
+        db.rollback()
+    
+    return jsonify({
+        'dry_run': dry_run,
+        'referenced': len(referenced),
+        'removed': removed,
+        'bytes_freed': freed
+    })
+
 @app.route('/api/uploads', methods=['POST'])
 @require_admin
 def upload_image():
-    if 'file' not in request.files:
-        return jsonify({'error': 'No file provided'}), 400
+    # The raw image as the body with ?filename=, or (legacy, before admin.html
+    # sent raw bodies) a multipart form with a "file" field. Both are streamed
+    # to disk; request.files is never touched, since it would spool the body first.
+    multipart = request.mimetype == 'multipart/form-data'
+    overhead = UPLOAD_CHUNK_SIZE if multipart else 0
+    if request.content_length and request.content_length > MAX_UPLOAD_SIZE + overhead:
+        raise upload_too_large()
+
+    if multipart:
+        boundary = request.mimetype_params.get('boundary')
+        if not boundary:
+            return jsonify({'error': 'Malformed multipart body'}), 400
+        upload = MultipartUpload(request.stream, boundary)
+        if upload.filename is None:
+            return jsonify({'error': 'No file provided'}), 400
+        name, stream = upload.filename, upload
+    else:
+        name, stream = request.args.get('filename', ''), request.stream
 
-    file = request.files['file']
-    if file.filename == '':
+    if name == '':
         return jsonify({'error': 'No file selected'}), 400
 
-    ext = file.filename.rsplit('.', 1)[-1].lower() if '.' in file.filename else ''
+    ext = name.rsplit('.', 1)[-1].lower() if '.' in name else ''
     if ext not in ALLOWED_EXTENSIONS:
         return jsonify({'error': f'File type not allowed. Allowed: {", ".join(ALLOWED_EXTENSIONS)}'}), 400
 
-    file.seek(0, 2)
-    size = file.tell()
-    file.seek(0)
+    filename = store_upload(stream)
+    return jsonify(upload_result(filename)), 201
+
+
+@app.route('/api/uploads/sessions', methods=['POST'])
+@require_admin
+def create_upload_session():
+    data = request.get_json() or {}
+    name = data.get('filename') or ''
+    size = data.get('size')
+
+    ext = name.rsplit('.', 1)[-1].lower() if '.' in name else ''
+    if ext not in ALLOWED_EXTENSIONS:
+        return jsonify({'error': f'File type not allowed. Allowed: {", ".join(ALLOWED_EXTENSIONS)}'}), 400
+    if not isinstance(size, int) or isinstance(size, bool) or size <= 0:
+        return jsonify({'error': 'size must be a positive number of bytes'}), 400
     if size > MAX_UPLOAD_SIZE:
-        return jsonify({'error': f'File too large. Maximum size: {MAX_UPLOAD_SIZE // (1024*1024)}MB'}), 400
+        raise upload_too_large()
+
+    session_id = secrets.token_hex(16)
+    os.makedirs(UPLOAD_SESSION_DIR, exist_ok=True)
+    base = os.path.join(UPLOAD_SESSION_DIR, session_id)
+    open(base + '.part', 'wb').close()
+    with open(base + '.json', 'w') as f:
+        json.dump({'filename': name, 'size': size}, f)
+
+    return jsonify({
+        'id': session_id,
+        'offset': 0,
+        'size': size,
+        'chunk_size': UPLOAD_SESSION_CHUNK
+    }), 201
+
 
-    filename = f'{uuid.uuid4().hex}.{ext}'
-    file.save(os.path.join(UPLOAD_DIR, filename))
+@app.route('/api/uploads/sessions/<session_id>', methods=['GET'])
+@require_admin
+def get_upload_session(session_id):
+    paths = upload_session_paths(session_id)
+    if not paths:
+        return jsonify({'error': 'Upload session not found'}), 404
+
+    meta_path, part_path = paths
+    with open(meta_path) as f:
+        size = json.load(f)['size']
+    return jsonify({'id': session_id, 'offset': os.path.getsize(part_path), 'size': size})
+
+
+@app.route('/api/uploads/sessions/<session_id>', methods=['PUT'])
+@require_admin
+def put_upload_chunk(session_id):
+    """Append one chunk, sent with ``Content-Range: bytes <start>-<end>/<size>``.
+
+    The chunk must start where the stored data ends; otherwise the response is
+    409 with the current offset so the client can resume from there. The
+    request carrying the last byte completes the upload and returns 201.
+    """
+    paths = upload_session_paths(session_id)
+    if not paths:
+        return jsonify({'error': 'Upload session not found'}), 404
+
+    meta_path, part_path = paths
+    with open(meta_path) as f:
+        size = json.load(f)['size']
+
+    content_range = parse_content_range_header(request.headers.get('Content-Range'))
+    if content_range is None or content_range.units != 'bytes' or content_range.length != size:
+        return jsonify({'error': f'Content-Range must be "bytes <start>-<end>/{size}"'}), 400
+
+    with open(part_path, 'r+b') as out:
+        if fcntl is not None:
+            fcntl.flock(out, fcntl.LOCK_EX)
+        # The upload may have been completed by another request while we waited
+        if not os.path.exists(meta_path):
+            return jsonify({'error': 'Upload session not found'}), 404
+
+        offset = os.fstat(out.fileno()).st_size
+        if content_range.start != offset:
+            return jsonify({'error': 'Chunk does not start at the current offset', 'offset': offset}), 409
 
-    return jsonify({'url': f'/api/uploads/{filename}'}), 201
+        out.seek(offset)
+        offset += copy_upload(request.stream, out, offset=offset, limit=size)
+        out.flush()
+
+        if offset < size:
+            return jsonify({'id': session_id, 'offset': offset, 'size': size})
+
+        digest = hashlib.sha256()
+        out.seek(0)
+        for chunk in iter(lambda: out.read(UPLOAD_CHUNK_SIZE), b''):
+            digest.update(chunk)
+        filename = commit_upload(part_path, digest)
+        os.remove(meta_path)
+
+    return jsonify(upload_result(filename)), 201
 
 
 @app.route('/api/uploads/<filename>')
@@ -757,11 +2346,52 @@ def serve_upload(filename):
     safe_name = secure_filename(filename)
     if safe_name != filename:
         return jsonify({'error': 'Invalid filename'}), 400
-    return send_from_directory(UPLOAD_DIR, safe_name)
+    if not os.path.isfile(os.path.join(UPLOAD_DIR, safe_name)):
+        return jsonify({'error': 'File not found'}), 404
+
+    width = request.args.get('w', type=int)
+    fmt = request.args.get('format')
+    fallback = images.source_format(safe_name)
+
+    if (width or fmt) and fallback and images.available():
+        negotiated = fmt == 'auto'
+        if negotiated:
+            fmt = images.negotiate_format(request.headers.get('Accept'), fallback)
+        fmt = fmt or fallback
+        if fmt not in images.supported_formats():
+            return jsonify({'error': f'Unsupported format. Allowed: auto, {", ".join(images.supported_formats())}'}), 400
+
+        if width:
+            # Never re-encode a full-size copy under a larger variant's name
+            try:
+                size = images.image_size(os.path.join(UPLOAD_DIR, safe_name))
+            except images.ImageTooLarge:
+                return send_upload(safe_name)
+            width = images.pick_width(width, size[0] if size else None)
+        path = None
+        if width or fmt != fallback:
+            path = image_pipeline.ensure(safe_name, width, fmt, IMAGE_VARIANT_TIMEOUT)
+
+        if path:
+            response = send_upload(os.path.basename(path), variant=True)
+        elif width or fmt != fallback:
+            # Variant not ready yet: serve the original, but don't let it be cached under this URL
+            response = send_from_directory(UPLOAD_DIR, safe_name)
+        else:
+            response = send_upload(safe_name)
+        if negotiated:
+            response.vary.add('Accept')
+        return response
+
+    return send_upload(safe_name)
 
 
 with app.app_context():
     init_db()
 
+# Fresh data volume: render what is already published
+if not os.path.exists(os.path.join(STATIC_DIR, 'sitemap.xml')):
+    publish_static('*')
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=os.environ.get('FLASK_DEBUG', False))
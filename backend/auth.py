@@ -0,0 +1,69 @@
+"""
+Verified-token cache for the blog API
+Remembers recently checked JWTs so repeat requests skip signature verification
+"""
+
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+from cache import GenerationCounter
+
+REVOCATION_TAG = 'auth:revoked'
+
+
+def token_hash(token):
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+class VerifiedTokenCache:
+    """Bounded LRU of decoded token payloads, keyed by ``token_hash``.
+
+    Entries expire with the token's own ``exp`` claim. Revoking any token
+    bumps a generation shared with the response cache, which drops every
+    entry stored before it in all workers; the next request re-checks the
+    revocation list once and is cached again.
+    """
+
+    def __init__(self, max_entries=1024, generations=None):
+        self.max_entries = max_entries
+        self.generations = generations or GenerationCounter()
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def stamp(self):
+        return self.generations.get(REVOCATION_TAG)
+
+    def get(self, key):
+        if self.max_entries <= 0:
+            return None
+        generation = self.stamp()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            payload, stamp = entry
+            if payload['exp'] <= time.time() or stamp != generation:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return dict(payload)
+
+    def set(self, key, payload, stamp):
+        """Remember ``payload``; ``stamp`` is taken before the revocation check."""
+        if self.max_entries <= 0 or not isinstance(payload.get('exp'), (int, float)):
+            return
+        with self._lock:
+            self._entries[key] = (dict(payload), stamp)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def revoke(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+        self.generations.bump(REVOCATION_TAG)
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,396 @@
+"""
+Benchmark and load-test harness for the blog API
+
+Seeds a synthetic database through the app's own schema (init_db), then drives
+the main endpoints through the Flask test client and/or a real gunicorn
+instance and prints machine-readable JSON results.
+
+Usage:
+    python benchmark.py --posts 2000 --comments 20000 --requests 1000
+    python benchmark.py --mode gunicorn --concurrency 16 --output bench.json
+    python benchmark.py --compare old.json new.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import socket
+import argparse
+import platform
+import contextlib
+import resource
+import tempfile
+import subprocess
+import threading
+import urllib.request
+import urllib.error
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+ADMIN_PASSWORD = 'benchmark-password'
+
+CATEGORIES = ['Quality Assurance', 'Compliance', 'Technology', 'Research', 'Clinical', 'Product News']
+TAGS = [
+    'QA', 'Doppler', 'Ultrasound', 'Compliance', 'ACR', 'Accreditation', 'HIFU',
+    'Phantom', 'Calibration', 'Research', 'Cardiac', 'Vascular', 'Obstetrics', 'Physics'
+]
+WORDS = (
+    'ultrasound doppler velocity phantom calibration accuracy transducer beam '
+    'frequency flow string measurement clinical quality assurance accreditation '
+    'focus intensity tissue vascular cardiac imaging resolution artifact gain'
+).split()
+
+
+def load_app(db_path, cache=True):
+    """Import the Flask app against ``db_path``; import runs init_db() and the first static render."""
+    os.environ['DATABASE_PATH'] = db_path
+    os.environ['ADMIN_PASSWORD'] = ADMIN_PASSWORD
+    os.environ.setdefault('ADMIN_KEY', 'benchmark-admin-key')
+    if not cache:
+        os.environ['RESPONSE_CACHE_SIZE'] = '0'
+    # All load comes from one address; keep the comment and login limiters in the path without tripping them
+    os.environ.setdefault('COMMENT_RATE_PER_MINUTE', '1000000000')
+    os.environ.setdefault('COMMENT_BURST', '1000000000')
+    os.environ.setdefault('LOGIN_RATE_PER_MINUTE', '1000000000')
+    os.environ.setdefault('LOGIN_BURST', '1000000000')
+    sys.path.insert(0, BACKEND_DIR)
+    # init_db() prints the admin bootstrap notice; stdout is reserved for the JSON report
+    with contextlib.redirect_stdout(sys.stderr):
+        import app
+    # Finish the import-time static render before anything is measured. It leaves
+    # sitemap.xml behind, so gunicorn workers sharing the database skip theirs.
+    app.static_queue.flush(timeout=60)
+    return app
+
+
+def paragraph(rng, sentences=5):
+    return ' '.join(
+        ' '.join(rng.choice(WORDS) for _ in range(rng.randint(8, 18))).capitalize() + '.'
+        for _ in range(sentences)
+    )
+
+
+def seed(app_module, posts, comments, seed_value=42):
+    """Fill the database with ``posts`` posts and ``comments`` threaded comments."""
+    rng = random.Random(seed_value)
+    conn = app_module.connect_db()
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+
+    with conn:
+        post_ids = []
+        for i in range(posts):
+            created = start + timedelta(minutes=i * 37)
+            tags = ','.join(rng.sample(TAGS, rng.randint(1, 4)))
+            content = ''.join(
+                f'<h3>{paragraph(rng, 1)}</h3><p>{paragraph(rng)}</p>' for _ in range(rng.randint(3, 8))
+            )
+            cursor = conn.execute('''
+                INSERT INTO posts (title, slug, excerpt, content, author, category, tags, published, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                f'Benchmark post {i}: {paragraph(rng, 1)[:60]}',
+                f'benchmark-post-{i}',
+                paragraph(rng, 2),
+                content,
+                rng.choice(['Dr. Sarah Chen', 'Michael Torres, RDMS', 'Dr. Elena Rodriguez, PhD']),
+                rng.choice(CATEGORIES),
+                tags,
+                1 if rng.random() > 0.05 else 0,
+                created.strftime('%Y-%m-%d %H:%M:%S'),
+                created.strftime('%Y-%m-%d %H:%M:%S')
+            ))
+            app_module.sync_post_tags(conn, cursor.lastrowid, tags)
+            post_ids.append(cursor.lastrowid)
+
+        # Skew comments toward a few popular posts, and thread ~40% of them as replies
+        thread_roots = {}
+        for i in range(comments):
+            post_id = post_ids[min(int(rng.paretovariate(1.2)) - 1, len(post_ids) - 1)] if post_ids else None
+            if post_id is None:
+                break
+            existing = thread_roots.setdefault(post_id, [])
+            parent_id = rng.choice(existing) if existing and rng.random() < 0.4 else None
+            cursor = conn.execute('''
+                INSERT INTO comments (post_id, parent_id, author_name, author_email, content, approved)
+                VALUES (?, ?, ?, ?, ?, 1)
+            ''', (post_id, parent_id, f'Reader {i}', f'reader{i}@example.com', paragraph(rng, 2)))
+            existing.append(cursor.lastrowid)
+
+    slugs = [row[0] for row in conn.execute('SELECT slug FROM posts WHERE published = 1')]
+    popular = [row[0] for row in conn.execute('''
+        SELECT p.slug FROM posts p JOIN comments c ON c.post_id = p.id
+        WHERE p.published = 1 GROUP BY p.id ORDER BY COUNT(*) DESC LIMIT 20
+    ''')]
+    conn.close()
+    return slugs, popular or slugs[:20]
+
+
+def build_scenarios(slugs, popular, args):
+    """Endpoint name -> (request count, factory returning (method, path, json body))."""
+    rng = random.Random(7)
+    pages = max(1, len(slugs) // 10)
+    counter = iter(range(10 ** 9))
+
+    def comment_body():
+        n = next(counter)
+        return {
+            'author_name': f'Load tester {n}',
+            'author_email': f'load{n}@example.com',
+            'content': f'Benchmark comment {n}'
+        }
+
+    return {
+        'get_posts': (args.requests, lambda: ('GET', f'/api/posts?page={rng.randint(1, pages)}&per_page=10', None)),
+        'get_post': (args.requests, lambda: ('GET', f'/api/posts/{rng.choice(slugs)}', None)),
+        'get_comments': (args.requests, lambda: ('GET', f'/api/posts/{rng.choice(popular)}/comments', None)),
+        'get_categories': (args.requests, lambda: ('GET', '/api/categories', None)),
+        'create_comment': (args.write_requests, lambda: ('POST', f'/api/posts/{rng.choice(popular)}/comments', comment_body())),
+        'login': (args.login_requests, lambda: ('POST', '/api/auth/login', {'username': 'admin', 'password': ADMIN_PASSWORD})),
+    }
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies, errors, elapsed):
+    values = sorted(latencies)
+    ms = lambda v: round(v * 1000, 3) if v is not None else None
+    return {
+        'requests': len(values) + errors,
+        'errors': errors,
+        'p50_ms': ms(percentile(values, 50)),
+        'p95_ms': ms(percentile(values, 95)),
+        'p99_ms': ms(percentile(values, 99)),
+        'mean_ms': ms(sum(values) / len(values)) if values else None,
+        'max_ms': ms(values[-1]) if values else None,
+        'rps': round((len(values) + errors) / elapsed, 1) if elapsed > 0 else None
+    }
+
+
+def run_load(send, scenarios, concurrency):
+    results = {}
+    for name, (count, factory) in scenarios.items():
+        if count <= 0:
+            continue
+        requests = [factory() for _ in range(count)]
+        latencies = []
+        errors = [0]
+        lock = threading.Lock()
+
+        def one(req):
+            method, path, body = req
+            start = time.perf_counter()
+            ok = send(method, path, body)
+            duration = time.perf_counter() - start
+            with lock:
+                if ok:
+                    latencies.append(duration)
+                else:
+                    errors[0] += 1
+
+        started = time.perf_counter()
+        if concurrency <= 1:
+            for req in requests:
+                one(req)
+        else:
+            with ThreadPoolExecutor(concurrency) as pool:
+                list(pool.map(one, requests))
+        results[name] = summarize(latencies, errors[0], time.perf_counter() - started)
+    return results
+
+
+def bench_test_client(app_module, scenarios, concurrency):
+    client = app_module.app.test_client()
+
+    def send(method, path, body):
+        response = client.open(path, method=method, json=body)
+        return response.status_code < 400
+
+    results = run_load(send, scenarios, concurrency)
+    return {
+        'endpoints': results,
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    }
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def child_pids(pid):
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            return [int(p) for p in f.read().split()]
+    except OSError:
+        return []
+
+
+def peak_rss_kb(pid):
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def bench_gunicorn(db_path, scenarios, concurrency, args):
+    port = free_port()
+    env = dict(os.environ, DATABASE_PATH=db_path, PORT=str(port))
+    env.setdefault('WEB_CONCURRENCY', str(args.workers))
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app'],
+        cwd=BACKEND_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    base = f'http://127.0.0.1:{port}'
+
+    try:
+        deadline = time.time() + 30
+        while True:
+            try:
+                urllib.request.urlopen(f'{base}/health', timeout=1)
+                break
+            except (urllib.error.URLError, ConnectionError):
+                if proc.poll() is not None or time.time() > deadline:
+                    raise RuntimeError('gunicorn did not start')
+                time.sleep(0.2)
+
+        def send(method, path, body):
+            data = json.dumps(body).encode('utf-8') if body is not None else None
+            req = urllib.request.Request(
+                base + path, data=data, method=method,
+                headers={'Content-Type': 'application/json'}
+            )
+            try:
+                with urllib.request.urlopen(req, timeout=30) as response:
+                    response.read()
+                    return response.status < 400
+            except (urllib.error.URLError, ConnectionError):
+                return False
+
+        results = run_load(send, scenarios, concurrency)
+        workers = child_pids(proc.pid)
+        rss = [peak_rss_kb(pid) for pid in workers]
+        rss = [r for r in rss if r is not None]
+        return {
+            'endpoints': results,
+            'workers': len(workers),
+            'peak_rss_kb': max(rss) if rss else None,
+            'total_peak_rss_kb': sum(rss) if rss else None
+        }
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(old_path, new_path):
+    """Print p95 and rps deltas between two result files."""
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+
+    rows = []
+    for mode, result in new['results'].items():
+        for endpoint, stats in result['endpoints'].items():
+            before = old['results'].get(mode, {}).get('endpoints', {}).get(endpoint)
+            if not before:
+                continue
+            rows.append({
+                'mode': mode,
+                'endpoint': endpoint,
+                'p95_ms': [before['p95_ms'], stats['p95_ms']],
+                'rps': [before['rps'], stats['rps']]
+            })
+    print(json.dumps(rows, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the blog API')
+    parser.add_argument('--posts', type=int, default=1000)
+    parser.add_argument('--comments', type=int, default=10000)
+    parser.add_argument('--requests', type=int, default=500, help='requests per read endpoint')
+    parser.add_argument('--write-requests', type=int, default=100, help='create_comment requests')
+    parser.add_argument('--login-requests', type=int, default=10, help='login requests (bcrypt bound)')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers')
+    parser.add_argument('--mode', choices=['client', 'gunicorn', 'both'], default='both')
+    parser.add_argument('--no-cache', action='store_true', help='disable the response cache')
+    parser.add_argument('--db', help='database path (default: a temporary file)')
+    parser.add_argument('--output', help='write JSON results to this file')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='compare two result files')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    workdir = tempfile.mkdtemp(prefix='blog-bench-')
+    db_path = args.db or os.path.join(workdir, 'blog.db')
+    if args.no_cache:
+        os.environ['RESPONSE_CACHE_SIZE'] = '0'
+    # Keep cache and upload files next to the benchmark database
+    os.environ.setdefault('CACHE_DIR', os.path.join(os.path.dirname(db_path), 'cache'))
+
+    app_module = load_app(db_path, cache=not args.no_cache)
+    started = time.perf_counter()
+    slugs, popular = seed(app_module, args.posts, args.comments)
+    seed_seconds = time.perf_counter() - started
+
+    output = {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'sqlite': app_module.sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'posts': args.posts,
+            'comments': args.comments,
+            'concurrency': args.concurrency,
+            'cache': not args.no_cache,
+            'seed_seconds': round(seed_seconds, 2)
+        },
+        'results': {}
+    }
+
+    if args.mode in ('client', 'both'):
+        scenarios = build_scenarios(slugs, popular, args)
+        output['results']['test_client'] = bench_test_client(app_module, scenarios, args.concurrency)
+
+    if args.mode in ('gunicorn', 'both'):
+        scenarios = build_scenarios(slugs, popular, args)
+        output['results']['gunicorn'] = bench_gunicorn(db_path, scenarios, args.concurrency, args)
+
+    text = json.dumps(output, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,362 @@
+"""
+Response cache for the blog API
+Bounded LRU/TTL store of serialized response bodies with tag-based invalidation
+
+Two backends are available:
+
+* ``memory`` keeps entries in each worker process (fastest, but every gunicorn
+  worker warms its own copy)
+* ``sqlite`` keeps entries in a SQLite file on the data volume shared by all
+  workers
+
+Both share a ``GenerationCounter`` mapped from a small file, so invalidating a
+tag in one worker is seen by every other worker on its next read.
+"""
+
+import os
+import json
+import mmap
+import time
+import zlib
+import struct
+import sqlite3
+import threading
+from collections import OrderedDict
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+
+class GenerationCounter:
+    """Per-tag generation numbers, optionally shared between processes.
+
+    Tags are hashed into a fixed number of 64-bit slots in an mmap-ed file.
+    Bumping a tag increments its slot; readers compare the slots they saw when
+    an entry was stored. Collisions only cause extra invalidations.
+    """
+
+    SLOTS = 1024
+    SLOT = struct.Struct('<Q')
+
+    def __init__(self, path=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+
+        if path:
+            try:
+                self._file = open(path, 'a+b')
+                size = self.SLOTS * self.SLOT.size
+                if os.fstat(self._file.fileno()).st_size < size:
+                    self._file.truncate(size)
+                self._buf = mmap.mmap(self._file.fileno(), size)
+                return
+            except OSError:
+                if self._file:
+                    self._file.close()
+                self._file = None
+                self.path = None
+
+        self._buf = bytearray(self.SLOTS * self.SLOT.size)
+
+    @property
+    def shared(self):
+        return self._file is not None
+
+    def get(self, tag):
+        return self.SLOT.unpack_from(self._buf, self._offset(tag))[0]
+
+    def stamp(self, tags):
+        return tuple(self.get(tag) for tag in tags)
+
+    def bump(self, *tags):
+        with self._lock:
+            if self._file is not None and fcntl is not None:
+                fcntl.flock(self._file, fcntl.LOCK_EX)
+            try:
+                for offset in {self._offset(tag) for tag in tags}:
+                    value = self.SLOT.unpack_from(self._buf, offset)[0]
+                    self.SLOT.pack_into(self._buf, offset, value + 1)
+            finally:
+                if self._file is not None and fcntl is not None:
+                    fcntl.flock(self._file, fcntl.LOCK_UN)
+
+    def _offset(self, tag):
+        return (zlib.crc32(tag.encode('utf-8')) % self.SLOTS) * self.SLOT.size
+
+
+class ResponseCache:
+    """In-process LRU cache of response bytes.
+
+    Every entry is stored with a set of tags (e.g. ``post:my-slug``) so a write
+    can invalidate exactly the responses that depend on the data it touched.
+    """
+
+    backend = 'memory'
+
+    def __init__(self, max_entries=512, ttl=300, generations=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.generations = generations or GenerationCounter()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._tags = {}
+        self._lock = threading.Lock()
+
+    def stamp(self, tags):
+        """Generation snapshot to pass to ``set``; take it before reading the data."""
+        return self.generations.stamp(tags)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            body, mimetype, tags, stamp, expires = entry
+            if expires <= time.monotonic() or self.generations.stamp(tags) != stamp:
+                self._remove(key)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return body, mimetype
+
+    def set(self, key, body, mimetype, tags=(), stamp=None):
+        if self.max_entries <= 0:
+            return
+
+        tags = tuple(tags)
+        if stamp is None:
+            stamp = self.generations.stamp(tags)
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = (body, mimetype, tags, stamp, time.monotonic() + self.ttl)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate(self, *tags):
+        self.generations.bump(*tags)
+        with self._lock:
+            for tag in tags:
+                for key in list(self._tags.get(tag, ())):
+                    self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'backend': self.backend,
+                'shared_generations': self.generations.shared,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+class SQLiteResponseCache:
+    """Response cache stored in a SQLite file shared by all worker processes.
+
+    Same interface as ``ResponseCache``. Hit/miss counters are per process.
+    """
+
+    backend = 'sqlite'
+    PRUNE_EVERY = 64
+
+    def __init__(self, path, max_entries=512, ttl=300, generations=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.generations = generations or GenerationCounter()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._writes = 0
+        self._local = threading.local()
+
+        conn = self._connect()
+        conn.executescript('''
+            CREATE TABLE IF NOT EXISTS cache_entries (
+                key TEXT PRIMARY KEY,
+                body BLOB NOT NULL,
+                mimetype TEXT NOT NULL,
+                tags TEXT NOT NULL,
+                stamp TEXT NOT NULL,
+                expires REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS cache_tags (
+                tag TEXT NOT NULL,
+                key TEXT NOT NULL,
+                PRIMARY KEY (tag, key)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_cache_entries_expires ON cache_entries (expires);
+        ''')
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=OFF')
+            self._local.conn = conn
+        return conn
+
+    def stamp(self, tags):
+        return self.generations.stamp(tags)
+
+    def get(self, key):
+        conn = self._connect()
+        key = json.dumps(key, separators=(',', ':'))
+        row = conn.execute(
+            'SELECT body, mimetype, tags, stamp, expires FROM cache_entries WHERE key = ?',
+            (key,)
+        ).fetchone()
+
+        if row is None:
+            self.misses += 1
+            return None
+
+        body, mimetype, tags, stamp, expires = row
+        if expires <= time.time() or list(self.generations.stamp(json.loads(tags))) != json.loads(stamp):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return body, mimetype
+
+    def set(self, key, body, mimetype, tags=(), stamp=None):
+        if self.max_entries <= 0:
+            return
+
+        tags = list(tags)
+        if stamp is None:
+            stamp = self.generations.stamp(tags)
+
+        conn = self._connect()
+        key = json.dumps(key, separators=(',', ':'))
+        try:
+            with conn:
+                conn.execute('BEGIN IMMEDIATE')
+                conn.execute(
+                    'INSERT OR REPLACE INTO cache_entries (key, body, mimetype, tags, stamp, expires) VALUES (?, ?, ?, ?, ?, ?)',
+                    (key, body, mimetype, json.dumps(tags), json.dumps(list(stamp)), time.time() + self.ttl)
+                )
+                conn.executemany(
+                    'INSERT OR IGNORE INTO cache_tags (tag, key) VALUES (?, ?)',
+                    [(tag, key) for tag in tags]
+                )
+        except sqlite3.OperationalError:
+            # Another worker holds the write lock; skipping a cache fill is harmless
+            return
+
+        self._writes += 1
+        if self._writes % self.PRUNE_EVERY == 0:
+            self.prune()
+
+    def invalidate(self, *tags):
+        self.generations.bump(*tags)
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute('BEGIN IMMEDIATE')
+                for tag in tags:
+                    conn.execute(
+                        'DELETE FROM cache_entries WHERE key IN (SELECT key FROM cache_tags WHERE tag = ?)',
+                        (tag,)
+                    )
+                    conn.execute('DELETE FROM cache_tags WHERE tag = ?', (tag,))
+        except sqlite3.OperationalError:
+            # The generation bump already makes the entries unreadable
+            pass
+
+    def prune(self):
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute('BEGIN IMMEDIATE')
+                conn.execute('DELETE FROM cache_entries WHERE expires <= ?', (time.time(),))
+                count = conn.execute('SELECT COUNT(*) FROM cache_entries').fetchone()[0]
+                overflow = count - self.max_entries
+                if overflow > 0:
+                    conn.execute('''
+                        DELETE FROM cache_entries WHERE key IN (
+                            SELECT key FROM cache_entries ORDER BY expires LIMIT ?
+                        )
+                    ''', (overflow,))
+                    self.evictions += overflow
+                conn.execute('DELETE FROM cache_tags WHERE key NOT IN (SELECT key FROM cache_entries)')
+        except sqlite3.OperationalError:
+            pass
+
+    def clear(self):
+        conn = self._connect()
+        with conn:
+            conn.execute('DELETE FROM cache_entries')
+            conn.execute('DELETE FROM cache_tags')
+
+    def stats(self):
+        entries = self._connect().execute('SELECT COUNT(*) FROM cache_entries').fetchone()[0]
+        return {
+            'backend': self.backend,
+            'shared_generations': self.generations.shared,
+            'entries': entries,
+            'max_entries': self.max_entries,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+        }
+
+
+def create_cache(backend='memory', max_entries=512, ttl=300, cache_dir=None):
+    """Build the configured cache backend.
+
+    When ``cache_dir`` is given, generation counters are shared through a file
+    in it, and the sqlite backend stores its entries there as well.
+    """
+    generations = None
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        generations = GenerationCounter(os.path.join(cache_dir, 'cache.gen'))
+
+    if backend == 'sqlite':
+        if not cache_dir:
+            raise ValueError('The sqlite cache backend requires a cache directory')
+        return SQLiteResponseCache(
+            os.path.join(cache_dir, 'cache.db'), max_entries, ttl, generations
+        )
+    if backend != 'memory':
+        raise ValueError(f'Unknown cache backend: {backend}')
+    return ResponseCache(max_entries, ttl, generations)
@@ -0,0 +1,203 @@
+"""
+Sitemaps, RSS/Atom feeds and llms text for published blog posts
+Kept up to date alongside the pre-rendered pages; only the parts a change touches are rewritten
+"""
+
+import os
+import re
+import html
+from datetime import timezone
+from email.utils import format_datetime
+
+from prerender import SITE_NAME, esc, parse_date, iso_date, renderable, write_atomic, write_compressed, remove_compressed
+
+SITEMAP_NS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+BLOCK_TAGS_RE = re.compile(r'</?(p|div|br|li|ul|ol|h[1-6]|blockquote|pre|tr|table|section|article)\b[^>]*>', re.IGNORECASE)
+
+
+def rfc822_date(value):
+    parsed = parse_date(value)
+    return format_datetime(parsed.replace(tzinfo=timezone.utc)) if parsed else ''
+
+
+def html_to_text(markup):
+    """Plain text with paragraph breaks kept, for llms-full.txt."""
+    text = re.sub(r'<(script|style)\b.*?</\1\s*>', ' ', markup or '', flags=re.IGNORECASE | re.DOTALL)
+    text = BLOCK_TAGS_RE.sub('\n', text)
+    text = html.unescape(re.sub(r'<[^>]+>', '', text))
+    lines = (re.sub(r'[ \t]+', ' ', line).strip() for line in text.splitlines())
+    return re.sub(r'\n{3,}', '\n\n', '\n'.join(lines)).strip()
+
+
+class Syndication:
+    """Writes everything under ``output_dir``, next to the pre-rendered pages.
+
+    - ``sitemap.xml``: index of the hand-written ``/sitemap-pages.xml`` plus
+      ``sitemaps/posts-N.xml`` shards. Posts are sharded by id, so an edit
+      rewrites one shard and the index.
+    - ``blog/feed.xml`` (RSS 2.0) and ``blog/atom.xml``: the newest posts.
+    - ``blog/llms-full.txt``: every post as plain text, assembled from
+      per-post fragments so only changed posts are converted again.
+
+    Files whose bytes haven't changed are left alone, so nginx keeps serving
+    the same ETag and Last-Modified to crawlers.
+    """
+
+    def __init__(self, output_dir, site_url, shard_size=1000, feed_size=20):
+        self.output_dir = output_dir
+        self.site_url = site_url.rstrip('/')
+        self.shard_size = shard_size
+        self.feed_size = feed_size
+
+    @property
+    def fragment_dir(self):
+        return os.path.join(self.output_dir, '.llms')
+
+    def url(self, path):
+        return f'{self.site_url}{path}'
+
+    def post_url(self, slug):
+        return self.url(f'/blog/{slug}/')
+
+    def shard_for(self, post_id):
+        return (post_id - 1) // self.shard_size
+
+    def shard_path(self, shard):
+        return os.path.join(self.output_dir, 'sitemaps', f'posts-{shard + 1}.xml')
+
+    def write_sitemaps(self, posts, shards=None):
+        """Rewrite the given shards (all if None) and the index.
+
+        ``posts`` are all published posts with ``id``, ``slug`` and ``updated_at``;
+        only those with a pre-rendered page are listed.
+        """
+        by_shard = {}
+        for post in posts:
+            if not renderable(post['slug']):
+                continue
+            by_shard.setdefault(self.shard_for(post['id']), []).append(post)
+
+        if shards is None:
+            shards = set(by_shard) | self.existing_shards()
+        for shard in shards:
+            entries = sorted(by_shard.get(shard, []), key=lambda post: post['id'])
+            if not entries:
+                remove_compressed(self.shard_path(shard))
+                continue
+            urls = ''.join(
+                f'  <url>\n    <loc>{esc(self.post_url(post["slug"]))}</loc>\n'
+                f'    <lastmod>{iso_date(post["updated_at"])}</lastmod>\n  </url>\n'
+                for post in entries
+            )
+            text = f'<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="{SITEMAP_NS}">\n{urls}</urlset>\n'
+            write_compressed(self.shard_path(shard), text.encode('utf-8'))
+
+        sitemaps = [f'  <sitemap>\n    <loc>{esc(self.url("/sitemap-pages.xml"))}</loc>\n  </sitemap>\n']
+        for shard in sorted(by_shard):
+            lastmod = max(iso_date(post['updated_at']) for post in by_shard[shard])
+            sitemaps.append(
+                f'  <sitemap>\n    <loc>{esc(self.url(f"/sitemaps/posts-{shard + 1}.xml"))}</loc>\n'
+                f'    <lastmod>{lastmod}</lastmod>\n  </sitemap>\n'
+            )
+        text = f'<?xml version="1.0" encoding="UTF-8"?>\n<sitemapindex xmlns="{SITEMAP_NS}">\n{"".join(sitemaps)}</sitemapindex>\n'
+        write_compressed(os.path.join(self.output_dir, 'sitemap.xml'), text.encode('utf-8'))
+
+    def existing_shards(self):
+        try:
+            names = os.listdir(os.path.join(self.output_dir, 'sitemaps'))
+        except FileNotFoundError:
+            return set()
+        return {int(m.group(1)) - 1 for m in map(re.compile(r'posts-(\d+)\.xml$').match, names) if m}
+
+    def write_feeds(self, posts):
+        """RSS and Atom for ``posts``, the newest ``feed_size`` published posts with content."""
+        posts = posts[:self.feed_size]
+        updated = max((iso_date(post['updated_at']) for post in posts), default='')
+
+        items = ''.join(
+            '    <item>\n'
+            f'      <title>{esc(post["title"])}</title>\n'
+            f'      <link>{esc(self.post_url(post["slug"]))}</link>\n'
+            f'      <guid isPermaLink="true">{esc(self.post_url(post["slug"]))}</guid>\n'
+            f'      <pubDate>{rfc822_date(post["created_at"])}</pubDate>\n'
+            f'      <category>{esc(post["category"])}</category>\n'
+            f'      <description>{esc(post["excerpt"] or post["title"])}</description>\n'
+            f'      <content:encoded>{esc(post["content"])}</content:encoded>\n'
+            '    </item>\n'
+            for post in posts
+        )
+        rss = (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<rss version="2.0" xmlns:atom="http://www.w3.org/2005/Atom" xmlns:content="http://purl.org/rss/1.0/modules/content/">\n'
+            '  <channel>\n'
+            f'    <title>{esc(SITE_NAME)} Blog</title>\n'
+            f'    <link>{esc(self.url("/blog/"))}</link>\n'
+            f'    <atom:link href="{esc(self.url("/blog/feed.xml"))}" rel="self" type="application/rss+xml"/>\n'
+            '    <description>Articles on ultrasound calibration, doppler phantoms and HIFU.</description>\n'
+            '    <language>en</language>\n'
+            f'{items}'
+            '  </channel>\n'
+            '</rss>\n'
+        )
+        write_compressed(os.path.join(self.output_dir, 'blog', 'feed.xml'), rss.encode('utf-8'))
+
+        entries = ''.join(
+            '  <entry>\n'
+            f'    <title>{esc(post["title"])}</title>\n'
+            f'    <link href="{esc(self.post_url(post["slug"]))}"/>\n'
+            f'    <id>{esc(self.post_url(post["slug"]))}</id>\n'
+            f'    <published>{iso_date(post["created_at"])}</published>\n'
+            f'    <updated>{iso_date(post["updated_at"])}</updated>\n'
+            f'    <author><name>{esc(post["author"])}</name></author>\n'
+            f'    <summary>{esc(post["excerpt"] or post["title"])}</summary>\n'
+            f'    <content type="html">{esc(post["content"])}</content>\n'
+            '  </entry>\n'
+            for post in posts
+        )
+        atom = (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<feed xmlns="http://www.w3.org/2005/Atom">\n'
+            f'  <title>{esc(SITE_NAME)} Blog</title>\n'
+            f'  <link href="{esc(self.url("/blog/"))}"/>\n'
+            f'  <link href="{esc(self.url("/blog/atom.xml"))}" rel="self"/>\n'
+            f'  <id>{esc(self.url("/blog/"))}</id>\n'
+            f'  <updated>{updated}</updated>\n'
+            f'{entries}'
+            '</feed>\n'
+        )
+        write_compressed(os.path.join(self.output_dir, 'blog', 'atom.xml'), atom.encode('utf-8'))
+
+    def fragment_path(self, post_id):
+        return os.path.join(self.fragment_dir, f'{post_id}.txt')
+
+    def write_llms_entry(self, post):
+        text = (
+            f'## {post["title"]}\n\n'
+            f'URL: {self.post_url(post["slug"])}\n'
+            f'Published: {iso_date(post["created_at"])[:10]} | Category: {post["category"]}\n\n'
+            f'{html_to_text(post["content"])}\n\n---\n\n'
+        )
+        write_atomic(self.fragment_path(post['id']), text.encode('utf-8'))
+
+    def remove_llms_entry(self, post_id):
+        try:
+            os.remove(self.fragment_path(post_id))
+        except FileNotFoundError:
+            pass
+
+    def write_llms_full(self, post_ids, load_post):
+        """Concatenate fragments in ``post_ids`` order; ``load_post(id)`` fills in missing ones."""
+        parts = [
+            f'# {SITE_NAME} - Blog Articles\n\n'
+            f'> Full text of every published article. Product reference: {self.url("/llms-full.txt")}\n\n'.encode('utf-8')
+        ]
+        for post_id in post_ids:
+            path = self.fragment_path(post_id)
+            if not os.path.exists(path):
+                post = load_post(post_id)
+                if post is None:
+                    continue
+                self.write_llms_entry(post)
+            with open(path, 'rb') as f:
+                parts.append(f.read())
+        write_compressed(os.path.join(self.output_dir, 'blog', 'llms-full.txt'), b''.join(parts))
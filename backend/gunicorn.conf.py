@@ -0,0 +1,22 @@
+"""
+Gunicorn settings for the blog API
+
+Threaded workers by default: concurrent GETs share each worker's read
+connection pool, and a slow login or upload only occupies one thread
+instead of a whole worker. Set GUNICORN_WORKER_CLASS=sync to go back to
+one request per worker.
+"""
+
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = 30
+keepalive = 5
+
+# Recycle workers now and then so slow leaks can't accumulate
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 5000))
+max_requests_jitter = 500
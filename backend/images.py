@@ -0,0 +1,236 @@
+"""
+Image derivatives for blog uploads
+Resized WebP/AVIF/original-format variants, generated off the request path and cached on disk
+
+Pillow is optional: without it uploads are served as-is and no variants are offered.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:  # pragma: no cover - Pillow not installed
+    Image = None
+
+# Named sizes offered in srcset manifests (CSS pixels wide)
+VARIANT_WIDTHS = {'thumb': 320, 'card': 640, 'full': 1280}
+
+# Formats Pillow can encode, with encoder settings tuned for photos
+ENCODERS = {
+    'avif': ('AVIF', {'quality': 55, 'speed': 6}),
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+    'png': ('PNG', {'optimize': True}),
+}
+MIMETYPES = {'avif': 'image/avif', 'webp': 'image/webp', 'jpeg': 'image/jpeg', 'png': 'image/png', 'gif': 'image/gif'}
+
+# Source extensions we derive from; animated GIFs are served untouched
+SOURCE_FORMATS = {'jpg': 'jpeg', 'jpeg': 'jpeg', 'png': 'png', 'webp': 'webp'}
+
+# Leading bytes of each accepted upload type; WebP is checked separately
+MAGIC_NUMBERS = (
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+)
+SNIFF_BYTES = 12
+
+
+class ImageTooLarge(Exception):
+    """Pixel dimensions past Pillow's decompression bomb limit."""
+
+
+def available():
+    return Image is not None
+
+
+def supported_formats():
+    if Image is None:
+        return []
+    formats = ['webp', 'jpeg', 'png']
+    if features.check('avif'):
+        formats.insert(0, 'avif')
+    return formats
+
+
+def source_format(filename):
+    ext = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    return SOURCE_FORMATS.get(ext)
+
+
+def mimetype_for(filename):
+    ext = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    return MIMETYPES.get(SOURCE_FORMATS.get(ext, ext))
+
+
+def sniff_type(head):
+    """Extension for the image type in the first SNIFF_BYTES of a file, or None."""
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    for magic, ext in MAGIC_NUMBERS:
+        if head.startswith(magic):
+            return ext
+    return None
+
+
+def image_size(path):
+    """(width, height) from the image header, or None.
+
+    Raises ImageTooLarge for a decompression bomb, which can't be decoded safely.
+    """
+    if Image is None:
+        return None
+    try:
+        with Image.open(path) as img:
+            return img.size
+    except Image.DecompressionBombError as error:
+        raise ImageTooLarge(str(error)) from error
+    except (OSError, ValueError):
+        return None
+
+
+def pick_width(requested, original_width):
+    """Snap a requested width to the smallest configured width that covers it.
+
+    Only configured widths are ever generated, so arbitrary ``?w=`` values
+    can't fill the disk.
+    """
+    widths = sorted(VARIANT_WIDTHS.values())
+    for width in widths:
+        if width >= requested:
+            break
+    if original_width and width >= original_width:
+        return None
+    return width
+
+
+def negotiate_format(accept, fallback):
+    accept = accept or ''
+    formats = supported_formats()
+    if 'image/avif' in accept and 'avif' in formats:
+        return 'avif'
+    if 'image/webp' in accept and 'webp' in formats:
+        return 'webp'
+    return fallback
+
+
+def variant_name(filename, width, fmt):
+    stem = filename.rsplit('.', 1)[0]
+    suffix = f'-{width}' if width else ''
+    return f'{stem}{suffix}.{fmt}'
+
+
+def render_variant(src_path, dest_path, width, fmt):
+    encoder, options = ENCODERS[fmt]
+    with Image.open(src_path) as img:
+        img = ImageOps.exif_transpose(img)
+        if width and img.width > width:
+            height = round(img.height * width / img.width)
+            img = img.resize((width, height), Image.LANCZOS)
+        if fmt == 'jpeg' and img.mode not in ('RGB', 'L'):
+            img = img.convert('RGB')
+        elif img.mode == 'P':
+            img = img.convert('RGBA')
+
+        tmp_path = f'{dest_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            img.save(tmp_path, encoder, **options)
+            os.replace(tmp_path, dest_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+class ImagePipeline:
+    """Generates variants on a small thread pool and deduplicates in-flight work."""
+
+    def __init__(self, upload_dir, variant_dir, max_workers=2):
+        self.upload_dir = upload_dir
+        self.variant_dir = variant_dir
+        self.max_workers = max_workers
+        self._executor = None
+        self._pid = None
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        # Executors don't survive fork; create one lazily per worker process
+        if self._executor is None or self._pid != os.getpid():
+            self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix='image-variants')
+            self._pid = os.getpid()
+            self._pending = {}
+        return self._executor
+
+    def variant_path(self, filename, width, fmt):
+        return os.path.join(self.variant_dir, variant_name(filename, width, fmt))
+
+    def submit(self, filename, width, fmt):
+        """Queue one variant; returns a future, or None if it already exists."""
+        dest = self.variant_path(filename, width, fmt)
+        if os.path.exists(dest):
+            return None
+
+        key = (filename, width, fmt)
+        with self._lock:
+            future = self._pending.get(key)
+            if future is None:
+                os.makedirs(self.variant_dir, exist_ok=True)
+                src = os.path.join(self.upload_dir, filename)
+                future = self._pool().submit(render_variant, src, dest, width, fmt)
+                self._pending[key] = future
+                future.add_done_callback(lambda _: self._forget(key))
+            return future
+
+    def _forget(self, key):
+        with self._lock:
+            self._pending.pop(key, None)
+
+    def ensure(self, filename, width, fmt, timeout=10):
+        """Path to the variant, generating it if needed; None if it isn't ready in time."""
+        future = self.submit(filename, width, fmt)
+        if future is not None:
+            try:
+                future.result(timeout=timeout)
+            except Exception:
+                return None
+        path = self.variant_path(filename, width, fmt)
+        return path if os.path.exists(path) else None
+
+    def widths_for(self, original_width):
+        return sorted(w for w in VARIANT_WIDTHS.values() if not original_width or w < original_width)
+
+    def generate_all(self, filename, original_width):
+        """Queue every size/format combination for a fresh upload."""
+        fallback = source_format(filename)
+        if not fallback:
+            return
+        for fmt in dict.fromkeys(supported_formats()[:2] + [fallback]):
+            for width in self.widths_for(original_width):
+                self.submit(filename, width, fmt)
+
+    def manifest(self, filename, url, size):
+        """srcset strings per format for the upload response."""
+        fallback = source_format(filename)
+        if not fallback or not available():
+            return None
+
+        original_width = size[0] if size else None
+        widths = self.widths_for(original_width)
+        srcset = {}
+        for fmt in dict.fromkeys(supported_formats()[:2] + [fallback]):
+            entries = [f'{url}?w={w}&format={fmt} {w}w' for w in widths]
+            if original_width:
+                original = url if fmt == fallback else f'{url}?format={fmt}'
+                entries.append(f'{original} {original_width}w')
+            srcset[fmt] = ', '.join(entries)
+
+        return {
+            'width': size[0] if size else None,
+            'height': size[1] if size else None,
+            'variants': {name: w for name, w in VARIANT_WIDTHS.items() if w in widths},
+            'srcset': srcset,
+            'sizes': '(max-width: 640px) 100vw, 640px'
+        }
@@ -0,0 +1,100 @@
+"""
+Password hashing for the blog API
+bcrypt runs on a small bounded thread pool so logins can't tie up every request thread's CPU
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+
+# Well-formed bcrypt salt and digest that no password matches; checked with the
+# configured cost when an account doesn't exist, so that takes as long as a wrong password
+DUMMY_HASH_BODY = 'N9qo8uLOickgx2ZMRZoMyeIjZAgcfl7p92ldGxad68LJZdL17lhWy'
+
+
+class HasherBusy(Exception):
+    pass
+
+
+def hash_password(password, rounds):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def check_password(password, password_hash):
+    try:
+        return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+    except ValueError:  # malformed stored hash
+        return False
+
+
+def hash_rounds(password_hash):
+    """Cost factor of a ``$2b$12$...`` hash, or None if it can't be read."""
+    parts = password_hash.split('$')
+    try:
+        return int(parts[2])
+    except (IndexError, ValueError):
+        return None
+
+
+class PasswordHasher:
+    """Runs bcrypt on ``max_workers`` threads with at most ``max_pending`` calls waiting.
+
+    bcrypt releases the GIL, so the pool size caps how many cores password
+    checks may use per process. Calls beyond the queue limit raise
+    ``HasherBusy`` immediately instead of queueing behind a login flood.
+    """
+
+    def __init__(self, rounds=12, max_workers=1, max_pending=8, timeout=10):
+        self.rounds = rounds
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._executor = None
+        self._pid = None
+        self._slots = threading.BoundedSemaphore(max_workers + max_pending)
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        # Executors don't survive fork; create one lazily per worker process
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix='bcrypt')
+                self._slots = threading.BoundedSemaphore(self.max_workers + self.max_pending)
+                self._pid = os.getpid()
+            return self._executor
+
+    def _run(self, fn, *args):
+        pool = self._pool()
+        slots = self._slots
+        if not slots.acquire(blocking=False):
+            raise HasherBusy('Too many password checks in progress')
+        try:
+            future = pool.submit(fn, *args)
+        except BaseException:
+            slots.release()
+            raise
+        # The slot belongs to the job, not the caller: a timed-out check that is
+        # still queued or running keeps counting against the limit until it ends
+        future.add_done_callback(lambda _: slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            future.cancel()
+            raise HasherBusy('Password check timed out')
+
+    def hash(self, password):
+        return self._run(hash_password, password, self.rounds)
+
+    def check(self, password, password_hash):
+        return self._run(check_password, password, password_hash)
+
+    def check_unknown(self, password):
+        """Spend a full check on an account that doesn't exist; always False."""
+        self.check(password, f'$2b${self.rounds:02d}${DUMMY_HASH_BODY}')
+        return False
+
+    def needs_rehash(self, password_hash):
+        return hash_rounds(password_hash) != self.rounds
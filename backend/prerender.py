@@ -0,0 +1,303 @@
+"""
+Static HTML for published blog posts
+Post and list pages rendered at publish time onto the data volume, so nginx serves them without the API
+
+brotli is optional: without it only the gzip copies are written next to each page.
+"""
+
+import os
+import re
+import gzip
+import html
+import json
+import shutil
+import tempfile
+import logging
+from datetime import datetime
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli not installed
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+SITE_NAME = 'JJ&A Ultrasound Instruments'
+STYLESHEETS = ('/css/01-base.css', '/css/02-components.css', '/css/03-layout.css', '/css/04-responsive.css')
+
+# Slugs that are safe as a directory name and don't collide with /blog/page/N/
+SLUG_RE = re.compile(r'[A-Za-z0-9][A-Za-z0-9_-]*')
+RESERVED_SLUGS = {'page'}
+
+PAGE_TEMPLATE = '''<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>{title}</title>
+    <meta name="description" content="{description}">
+    <meta name="robots" content="index, follow">
+    <link rel="canonical" href="{canonical}">
+    <meta property="og:type" content="{og_type}">
+    <meta property="og:url" content="{canonical}">
+    <meta property="og:title" content="{title}">
+    <meta property="og:description" content="{description}">
+    <link rel="alternate" type="application/rss+xml" title="{site} Blog" href="/blog/feed.xml">
+    <link rel="alternate" type="application/atom+xml" title="{site} Blog" href="/blog/atom.xml">
+{head}
+{stylesheets}
+</head>
+<body>
+    <main class="blog-section">
+        <div class="container">
+            <a class="blog-back-btn" href="{back_href}">{back_label}</a>
+{body}
+        </div>
+    </main>
+</body>
+</html>
+'''
+
+POST_BODY = '''            <article class="blog-post-full">
+                <header class="blog-post-header">
+                    <div class="blog-post-meta">
+                        <span class="blog-post-category">{category}</span>
+                        <time class="blog-post-date" datetime="{iso_date}">{date}</time>
+                    </div>
+                    <h1>{title}</h1>
+                    <div class="blog-post-author">
+                        <div class="author-avatar">{initials}</div>
+                        <span>{author}</span>
+                    </div>
+                </header>
+{image}
+                <div class="blog-post-content">
+{content}
+                </div>
+                <div class="blog-post-tags">{tags}</div>
+                <p><a href="{interactive_href}">Read the comments and join the discussion</a></p>
+            </article>'''
+
+CARD = '''                <article class="blog-card">
+                    <div class="blog-card-content">
+                        <div class="blog-card-meta">
+                            <span class="blog-card-category">{category}</span>
+                            <time class="blog-card-date" datetime="{iso_date}">{date}</time>
+                        </div>
+                        <h2><a href="{href}">{title}</a></h2>
+                        <p class="blog-card-excerpt">{excerpt}</p>
+                    </div>
+                </article>'''
+
+
+def esc(value):
+    return html.escape(str(value or ''), quote=True)
+
+
+def parse_date(value):
+    try:
+        return datetime.strptime(str(value)[:19], '%Y-%m-%d %H:%M:%S')
+    except ValueError:
+        return None
+
+
+def format_date(value):
+    parsed = parse_date(value)
+    return f'{parsed:%B} {parsed.day}, {parsed.year}' if parsed else ''
+
+
+def iso_date(value):
+    parsed = parse_date(value)
+    return parsed.strftime('%Y-%m-%dT%H:%M:%SZ') if parsed else ''
+
+
+def renderable(slug):
+    """Whether ``slug`` gets a pre-rendered page under /blog/."""
+    return bool(SLUG_RE.fullmatch(slug or '')) and slug not in RESERVED_SLUGS
+
+
+def initials(name):
+    return ''.join(part[0] for part in str(name or '').split()[:2]).upper()
+
+
+def write_atomic(path, data):
+    """Write bytes via a temp file in the same directory, so readers never see a partial file."""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.render-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def unchanged(path, data):
+    try:
+        with open(path, 'rb') as f:
+            return f.read() == data
+    except OSError:
+        return False
+
+
+def write_compressed(path, data):
+    """Write ``path`` plus ``.gz`` (and ``.br`` if available) for gzip_static/brotli_static.
+
+    The compressed copies go first, so nginx never pairs a new page with an
+    older precompressed one for long. Identical content isn't rewritten,
+    which keeps the file's ETag and Last-Modified stable.
+    """
+    if unchanged(path, data) and os.path.exists(path + '.gz'):
+        return False
+    write_atomic(path + '.gz', gzip.compress(data, 9, mtime=0))
+    if brotli is not None:
+        write_atomic(path + '.br', brotli.compress(data, quality=11))
+    write_atomic(path, data)
+    return True
+
+
+def remove_compressed(path):
+    for name in (path, path + '.gz', path + '.br'):
+        try:
+            os.remove(name)
+        except FileNotFoundError:
+            pass
+
+
+class StaticSite:
+    """Renders ``/blog/<slug>/`` and ``/blog/``, ``/blog/page/N/`` under ``output_dir``."""
+
+    def __init__(self, output_dir, site_url, per_page=10):
+        self.output_dir = output_dir
+        self.site_url = site_url.rstrip('/')
+        self.per_page = per_page
+
+    @property
+    def blog_dir(self):
+        return os.path.join(self.output_dir, 'blog')
+
+    def url(self, path):
+        return f'{self.site_url}{path}'
+
+    def page_path(self, page):
+        return '/blog/' if page == 1 else f'/blog/page/{page}/'
+
+    def rendered_slugs(self):
+        try:
+            names = os.listdir(self.blog_dir)
+        except FileNotFoundError:
+            return set()
+        return {name for name in names if renderable(name) and os.path.isdir(os.path.join(self.blog_dir, name))}
+
+    def page(self, title, description, path, body, og_type='website', head='', back=('/#blog', 'Back to the site')):
+        return PAGE_TEMPLATE.format(
+            title=esc(title),
+            description=esc(description),
+            canonical=esc(self.url(path)),
+            og_type=og_type,
+            site=esc(SITE_NAME),
+            head=head,
+            stylesheets='\n'.join(f'    <link rel="stylesheet" href="{href}">' for href in STYLESHEETS),
+            back_href=esc(back[0]),
+            back_label=esc(back[1]),
+            body=body
+        )
+
+    def render_post(self, post, tags=()):
+        """Write one published post; returns False if its slug can't be a path."""
+        slug = post['slug']
+        if not renderable(slug):
+            logger.warning('Not pre-rendering post with unsafe slug %r', slug)
+            return False
+
+        path = f'/blog/{slug}/'
+        description = post.get('excerpt') or post['title']
+        image = post.get('featured_image') or ''
+        structured = {
+            '@context': 'https://schema.org',
+            '@type': 'BlogPosting',
+            'headline': post['title'],
+            'description': description,
+            'datePublished': iso_date(post.get('created_at')),
+            'dateModified': iso_date(post.get('updated_at')),
+            'author': {'@type': 'Person', 'name': post.get('author') or ''},
+            'publisher': {'@type': 'Organization', 'name': SITE_NAME},
+            'mainEntityOfPage': self.url(path),
+        }
+        head = []
+        if image:
+            structured['image'] = image if image.startswith('http') else self.url(image)
+            head.append(f'    <meta property="og:image" content="{esc(structured["image"])}">')
+        # </script> can't appear inside the JSON-LD block
+        head.append('    <script type="application/ld+json">'
+                    + json.dumps(structured, ensure_ascii=False).replace('</', '<\\/')
+                    + '</script>')
+
+        body = POST_BODY.format(
+            category=esc(post.get('category')),
+            iso_date=iso_date(post.get('created_at')),
+            date=format_date(post.get('created_at')),
+            title=esc(post['title']),
+            initials=esc(initials(post.get('author'))),
+            author=esc(post.get('author')),
+            image=f'                <img src="{esc(image)}" alt="{esc(post["title"])}">' if image else '',
+            # Post bodies are admin-authored HTML, shown as-is like the SPA does
+            content=post['content'],
+            tags=''.join(f'<span class="blog-tag">{esc(tag)}</span>' for tag in tags),
+            interactive_href=esc(f'/#blog/{slug}')
+        )
+        text = self.page(
+            f'{post["title"]} | {SITE_NAME}', description, path, body,
+            og_type='article', head='\n'.join(head), back=('/blog/', 'All articles')
+        )
+        write_compressed(os.path.join(self.blog_dir, slug, 'index.html'), text.encode('utf-8'))
+        return True
+
+    def remove_post(self, slug):
+        if renderable(slug):
+            shutil.rmtree(os.path.join(self.blog_dir, slug), ignore_errors=True)
+
+    def render_index(self, posts):
+        """Write the paginated list of published posts (newest first) and drop stale pages."""
+        pages = max(1, -(-len(posts) // self.per_page))
+        for page in range(1, pages + 1):
+            chunk = posts[(page - 1) * self.per_page:page * self.per_page]
+            cards = '\n'.join(CARD.format(
+                category=esc(post.get('category')),
+                iso_date=iso_date(post.get('created_at')),
+                date=format_date(post.get('created_at')),
+                href=esc(f'/blog/{post["slug"]}/' if renderable(post['slug']) else f'/#blog/{post["slug"]}'),
+                title=esc(post['title']),
+                excerpt=esc(post.get('excerpt'))
+            ) for post in chunk)
+
+            links = []
+            head = []
+            if page > 1:
+                links.append(f'<a href="{self.page_path(page - 1)}" rel="prev">Newer articles</a>')
+                head.append(f'    <link rel="prev" href="{esc(self.url(self.page_path(page - 1)))}">')
+            if page < pages:
+                links.append(f'<a href="{self.page_path(page + 1)}" rel="next">Older articles</a>')
+                head.append(f'    <link rel="next" href="{esc(self.url(self.page_path(page + 1)))}">')
+
+            body = (
+                '            <h1>Blog</h1>\n'
+                '            <div class="blog-grid">\n'
+                f'{cards}\n'
+                '            </div>\n'
+                f'            <nav class="blog-pagination">{" ".join(links)}</nav>'
+            )
+            title = f'Blog | {SITE_NAME}' if page == 1 else f'Blog, page {page} | {SITE_NAME}'
+            text = self.page(title, 'Articles on ultrasound calibration, doppler phantoms and HIFU.',
+                             self.page_path(page), body, head='\n'.join(head))
+            directory = self.blog_dir if page == 1 else os.path.join(self.blog_dir, 'page', str(page))
+            write_compressed(os.path.join(directory, 'index.html'), text.encode('utf-8'))
+
+        page_dir = os.path.join(self.blog_dir, 'page')
+        if os.path.isdir(page_dir):
+            for name in os.listdir(page_dir):
+                if not name.isdigit() or not 1 < int(name) <= pages:
+                    shutil.rmtree(os.path.join(page_dir, name), ignore_errors=True)
@@ -0,0 +1,89 @@
+"""
+In-memory rate limiting for the blog API
+Per-key token buckets and a short-lived duplicate filter, bounded in size
+
+State is per process: with several gunicorn workers each one enforces the
+limits on the requests it sees.
+"""
+
+import time
+import threading
+from collections import OrderedDict
+
+
+class TokenBucketLimiter:
+    """Token bucket per key (client IP, email address, ...).
+
+    Each key may spend ``burst`` tokens at once and regains ``rate`` tokens
+    per second. The least recently used keys are dropped beyond ``max_keys``,
+    which only ever forgives a client.
+    """
+
+    def __init__(self, rate, burst, max_keys=10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def allow(self, key, cost=1):
+        """Take ``cost`` tokens; returns ``(allowed, retry_after_seconds)``."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+
+            if tokens >= cost:
+                self._store(key, tokens - cost, now)
+                return True, 0
+
+            self._store(key, tokens, now)
+            retry_after = (cost - tokens) / self.rate if self.rate > 0 else None
+            return False, retry_after
+
+    def reset(self, key):
+        with self._lock:
+            self._buckets.pop(key, None)
+
+    def _store(self, key, tokens, now):
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+
+
+class DuplicateFilter:
+    """Remembers recently seen keys for ``window`` seconds.
+
+    ``check`` returns the value stored with an earlier identical key, so a
+    repeated submission can be answered with the original result.
+    """
+
+    def __init__(self, window, max_entries=10000):
+        self.window = window
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def check(self, key, value):
+        """Return the earlier value for ``key``, or record ``value`` and return None."""
+        now = time.monotonic()
+        with self._lock:
+            while self._entries:
+                oldest, (_, seen) = next(iter(self._entries.items()))
+                if now - seen < self.window:
+                    break
+                del self._entries[oldest]
+
+            entry = self._entries.get(key)
+            if entry is not None:
+                return entry[0]
+
+            self._entries[key] = (value, now)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return None
+
+    def forget(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
@@ -0,0 +1,71 @@
+"""
+Queued comments: pending status across workers and dropped batches
+
+Run from backend/: python -m pytest test_comments.py
+"""
+
+import os
+import sys
+import uuid
+import tempfile
+import unittest
+import contextlib
+from unittest import mock
+
+WORKDIR = tempfile.mkdtemp(prefix='blog-test-')
+os.environ['DATABASE_PATH'] = os.path.join(WORKDIR, 'blog.db')
+os.environ.setdefault('ADMIN_PASSWORD', 'test-password')
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+with contextlib.redirect_stdout(sys.stderr):
+    import app as blog
+
+blog.static_queue.flush(timeout=60)
+
+SLUG = 'understanding-doppler-ultrasound-qa'
+
+
+class PendingCommentTest(unittest.TestCase):
+    def setUp(self):
+        self.client = blog.app.test_client()
+
+    def post_comment(self, content):
+        return self.client.post(f'/api/posts/{SLUG}/comments', json={
+            'author_name': 'Reader',
+            'author_email': 'reader@example.com',
+            'content': content
+        }, environ_base={'REMOTE_ADDR': f'10.0.0.{uuid.uuid4().int % 250 + 1}'})
+
+    def test_unknown_id_is_pending(self):
+        # Queued in another worker looks the same as unknown here
+        response = self.client.get(f'/api/comments/pending/{uuid.uuid4().hex}')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.get_json()['status'], 'pending')
+
+    def test_malformed_id_not_found(self):
+        response = self.client.get('/api/comments/pending/not-an-id')
+        self.assertEqual(response.status_code, 404)
+
+    def test_stored(self):
+        pending_id = self.post_comment('A comment that gets stored').get_json()['pending_id']
+        blog.comment_queue.flush(timeout=10)
+        response = self.client.get(f'/api/comments/pending/{pending_id}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['status'], 'stored')
+
+    def test_dropped_batch_allows_resubmission(self):
+        content = 'A comment whose batch is dropped'
+        with mock.patch.object(blog.comment_queue, 'write_batch', side_effect=blog.DatabaseBusy('busy')), \
+                mock.patch.object(blog.comment_queue, 'retries', 0):
+            first = self.post_comment(content).get_json()['pending_id']
+            blog.comment_queue.flush(timeout=10)
+
+        second = self.post_comment(content).get_json()['pending_id']
+        self.assertNotEqual(first, second)
+        blog.comment_queue.flush(timeout=10)
+        response = self.client.get(f'/api/comments/pending/{second}')
+        self.assertEqual(response.get_json()['status'], 'stored')
+
+
+if __name__ == '__main__':
+    unittest.main()
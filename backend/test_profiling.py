@@ -0,0 +1,96 @@
+"""
+Request profiling must detach the profiler however the request ends
+
+Run from backend/: python -m pytest test_profiling.py
+"""
+
+import os
+import sys
+import cProfile
+import tempfile
+import unittest
+import contextlib
+from unittest import mock
+
+WORKDIR = tempfile.mkdtemp(prefix='blog-test-')
+os.environ['DATABASE_PATH'] = os.path.join(WORKDIR, 'blog.db')
+os.environ.setdefault('ADMIN_PASSWORD', 'test-password')
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+with contextlib.redirect_stdout(sys.stderr):
+    import app as blog
+
+blog.static_queue.flush(timeout=60)
+
+
+class TrackingProfile(cProfile.Profile):
+    instances = []
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.active = False
+        TrackingProfile.instances.append(self)
+
+    def enable(self, *args, **kwargs):
+        self.active = True
+        super().enable(*args, **kwargs)
+
+    def disable(self):
+        self.active = False
+        super().disable()
+
+
+def explode():
+    raise RuntimeError('boom')
+
+
+blog.app.add_url_rule('/__test/explode', 'test_explode', explode)
+
+
+class RequestProfilingTest(unittest.TestCase):
+    def setUp(self):
+        TrackingProfile.instances.clear()
+        self.profile_dir = tempfile.mkdtemp(dir=WORKDIR)
+        patches = [
+            mock.patch.object(blog.cProfile, 'Profile', TrackingProfile),
+            mock.patch.object(blog, 'PROFILE_REQUESTS', True),
+            mock.patch.object(blog, 'PROFILE_SAMPLE_RATE', 1.0),
+            mock.patch.object(blog, 'PROFILE_SLOW_MS', 0),
+            mock.patch.object(blog, 'PROFILE_DIR', self.profile_dir),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.client = blog.app.test_client()
+
+    def profiles(self):
+        return [name for name in os.listdir(self.profile_dir) if name.endswith('.pstats')]
+
+    def test_completed_request_is_profiled(self):
+        response = self.client.get('/health')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(TrackingProfile.instances), 1)
+        self.assertFalse(TrackingProfile.instances[0].active)
+        self.assertEqual(len(self.profiles()), 1)
+
+    def test_profiler_detached_when_exception_propagates(self):
+        # TESTING propagates the exception, so after_request never runs
+        blog.app.testing = True
+        self.addCleanup(setattr, blog.app, 'testing', False)
+        with self.assertRaises(RuntimeError):
+            self.client.get('/__test/explode')
+        self.assertEqual(len(TrackingProfile.instances), 1)
+        self.assertFalse(TrackingProfile.instances[0].active)
+        self.assertIsNone(sys.getprofile())
+        self.assertEqual(len(self.profiles()), 1)
+
+    def test_profiler_detached_on_server_error(self):
+        response = self.client.get('/__test/explode')
+        self.assertEqual(response.status_code, 500)
+        self.assertFalse(TrackingProfile.instances[0].active)
+        self.assertIsNone(sys.getprofile())
+        self.assertEqual(len(self.profiles()), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
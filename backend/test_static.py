@@ -0,0 +1,65 @@
+"""
+Feeds, sitemaps and llms-full.txt only link to posts that were pre-rendered
+
+Run from backend/: python -m pytest test_static.py
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+import contextlib
+
+WORKDIR = tempfile.mkdtemp(prefix='blog-test-')
+os.environ['DATABASE_PATH'] = os.path.join(WORKDIR, 'blog.db')
+os.environ.setdefault('ADMIN_PASSWORD', 'test-password')
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+with contextlib.redirect_stdout(sys.stderr):
+    import app as blog
+
+blog.static_queue.flush(timeout=60)
+
+SLUGS = ('static-test-post', 'page', 'static test post')
+
+
+class UnrenderableSlugTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        conn = blog.connect_db()
+        with conn:
+            for i, slug in enumerate(SLUGS):
+                conn.execute('''
+                    INSERT INTO posts (title, slug, excerpt, content, author, category, tags, published)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, 1)
+                ''', (f'Static test {i}', slug, 'Excerpt', '<p>Body</p>', 'Tester', 'Research', ''))
+        conn.close()
+        blog.render_static_batch([('*', None)])
+
+    def read(self, *parts):
+        with open(os.path.join(blog.STATIC_DIR, *parts), encoding='utf-8') as f:
+            return f.read()
+
+    def assert_only_renderable(self, text):
+        self.assertIn('/blog/static-test-post/', text)
+        self.assertNotIn('/blog/page/<', text)
+        self.assertNotIn('/blog/page/\n', text)
+        self.assertNotIn('static test post/', text)
+
+    def test_rss_and_atom(self):
+        self.assert_only_renderable(self.read('blog', 'feed.xml'))
+        self.assert_only_renderable(self.read('blog', 'atom.xml'))
+
+    def test_llms_full(self):
+        self.assert_only_renderable(self.read('blog', 'llms-full.txt'))
+
+    def test_sitemap(self):
+        self.assert_only_renderable(self.read('sitemaps', 'posts-1.xml'))
+
+    def test_no_page_written(self):
+        self.assertTrue(os.path.isdir(os.path.join(blog.STATIC_DIR, 'blog', 'static-test-post')))
+        self.assertFalse(os.path.exists(os.path.join(blog.STATIC_DIR, 'blog', 'static test post')))
+
+
+if __name__ == '__main__':
+    unittest.main()
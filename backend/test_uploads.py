@@ -0,0 +1,127 @@
+"""
+Upload validation and image variant sizing
+
+Run from backend/: python -m pytest test_uploads.py
+"""
+
+import io
+import os
+import sys
+import time
+import tempfile
+import unittest
+import contextlib
+from unittest import mock
+
+WORKDIR = tempfile.mkdtemp(prefix='blog-test-')
+os.environ['DATABASE_PATH'] = os.path.join(WORKDIR, 'blog.db')
+os.environ.setdefault('ADMIN_PASSWORD', 'test-password')
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+with contextlib.redirect_stdout(sys.stderr):
+    import app as blog
+
+blog.static_queue.flush(timeout=60)
+
+from PIL import Image
+
+
+def png(width, height, color=(200, 40, 40)):
+    out = io.BytesIO()
+    Image.new('RGB', (width, height), color).save(out, 'PNG')
+    return out.getvalue()
+
+
+class UploadTest(unittest.TestCase):
+    def setUp(self):
+        self.client = blog.app.test_client()
+        self.headers = {'X-Admin-Key': blog.ADMIN_KEY}
+
+    def upload(self, body, name='image.png'):
+        return self.client.post(f'/api/uploads?filename={name}', data=body, headers=self.headers)
+
+    def test_decompression_bomb_rejected(self):
+        before = set(os.listdir(blog.UPLOAD_DIR))
+        # Lower the limit rather than building a real bomb; Pillow errors at twice this
+        with mock.patch.object(Image, 'MAX_IMAGE_PIXELS', 1000):
+            response = self.upload(png(100, 100, (1, 2, 3)))
+        self.assertEqual(response.status_code, 415)
+        self.assertEqual(set(os.listdir(blog.UPLOAD_DIR)), before)
+
+    def test_multipart_is_streamed(self):
+        body = png(40, 30, (9, 9, 9))
+        with mock.patch('werkzeug.formparser.MultiPartParser.parse', side_effect=AssertionError('spooled')):
+            response = self.client.post('/api/uploads', headers=self.headers, data={
+                'caption': 'ignored',
+                'file': (io.BytesIO(body), 'photo.png'),
+            })
+        self.assertEqual(response.status_code, 201)
+        filename = response.get_json()['url'].rsplit('/', 1)[-1]
+        with open(os.path.join(blog.UPLOAD_DIR, filename), 'rb') as f:
+            self.assertEqual(f.read(), body)
+
+    def test_multipart_rejects_non_image(self):
+        response = self.client.post('/api/uploads', headers=self.headers, data={
+            'file': (io.BytesIO(b'<?php echo 1; ?>' * 10), 'photo.png'),
+        })
+        self.assertEqual(response.status_code, 400)
+
+    def test_multipart_without_file(self):
+        response = self.client.post('/api/uploads', headers=self.headers, data={'caption': 'no file'},
+                                    content_type='multipart/form-data')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json()['error'], 'No file provided')
+
+    def test_width_past_original_serves_original(self):
+        response = self.upload(png(300, 200))
+        self.assertEqual(response.status_code, 201)
+        url = response.get_json()['url']
+
+        response = self.client.get(f'{url}?w=1280')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response.headers.get('Cache-Control', ''))
+        filename = url.rsplit('/', 1)[-1]
+        self.assertFalse(os.path.exists(blog.image_pipeline.variant_path(filename, 1280, 'png')))
+        response.close()
+
+
+class UploadGarbageCollectionTest(unittest.TestCase):
+    def setUp(self):
+        self.client = blog.app.test_client()
+        self.headers = {'X-Admin-Key': blog.ADMIN_KEY}
+        os.makedirs(blog.VARIANT_DIR, exist_ok=True)
+
+    def variant(self, name, age=0):
+        path = os.path.join(blog.VARIANT_DIR, name)
+        with open(path, 'wb') as f:
+            f.write(b'variant')
+        then = time.time() - age
+        os.utime(path, (then, then))
+        return path
+
+    def collect(self, dry_run):
+        response = self.client.post(f'/api/uploads/gc?dry_run={str(dry_run).lower()}', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        return response.get_json()['removed']
+
+    def test_orphaned_variants_swept(self):
+        url = self.client.post('/api/uploads?filename=kept.png', data=png(700, 50, (5, 6, 7)),
+                               headers=self.headers).get_json()['url']
+        stem = url.rsplit('/', 1)[-1].split('.')[0]
+        kept = self.variant(f'{stem}-640.webp', age=2 * 86400)
+        orphan = self.variant(f'{"f" * 64}-320.webp', age=2 * 86400)
+        fresh = self.variant(f'{"e" * 64}-320.webp')
+
+        removed = self.collect(dry_run=True)
+        self.assertIn(f'variants/{os.path.basename(orphan)}', removed)
+        self.assertTrue(os.path.exists(orphan))
+
+        removed = self.collect(dry_run=False)
+        self.assertIn(f'variants/{os.path.basename(orphan)}', removed)
+        self.assertFalse(os.path.exists(orphan))
+        self.assertTrue(os.path.exists(kept))
+        self.assertTrue(os.path.exists(fresh))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+"""
+Write-behind queue for the blog API
+Request threads enqueue rows; one background thread per process writes them in batches
+"""
+
+import os
+import time
+import queue
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFull(Exception):
+    pass
+
+
+class WriteBehindQueue:
+    """Buffers items and hands them to ``write_batch`` from a background thread.
+
+    The writer takes whatever has accumulated (up to ``batch_size``) as soon as
+    it is free, so a burst of submissions turns into a few transactions instead
+    of one per request. A failed batch is retried ``retries`` times, then
+    logged, passed to ``on_drop`` and dropped.
+    """
+
+    def __init__(self, write_batch, batch_size=100, max_pending=10000, retries=3, on_drop=None):
+        self.write_batch = write_batch
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.retries = retries
+        self.on_drop = on_drop
+        self._pid = None
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._reset()
+
+    def _reset(self):
+        self._queue = queue.Queue(self.max_pending)
+        self._pending = set()
+        self._unfinished = 0
+        self._thread = None
+
+    def _ensure_thread(self):
+        # Threads don't survive fork; start the writer lazily in each worker
+        if self._pid != os.getpid():
+            self._reset()
+            self._pid = os.getpid()
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+            self._thread.start()
+
+    def submit(self, key, item):
+        """Queue ``item``; ``key`` identifies it for ``is_pending`` until written."""
+        with self._lock:
+            self._ensure_thread()
+            try:
+                self._queue.put_nowait((key, item))
+            except queue.Full:
+                raise QueueFull('Write queue is full')
+            self._pending.add(key)
+            self._unfinished += 1
+
+    def is_pending(self, key):
+        with self._lock:
+            return key in self._pending
+
+    def depth(self):
+        return self._queue.qsize()
+
+    def flush(self, timeout=None):
+        """Wait until everything submitted so far has been written."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._idle:
+            while self._unfinished and self._pid == os.getpid():
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+        return True
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            self._write([item for _, item in batch])
+
+            with self._idle:
+                for key, _ in batch:
+                    self._pending.discard(key)
+                self._unfinished -= len(batch)
+                self._idle.notify_all()
+
+    def _write(self, items):
+        for attempt in range(self.retries + 1):
+            try:
+                self.write_batch(items)
+                return
+            except Exception:
+                if attempt == self.retries:
+                    logger.exception('Dropping %d queued writes after %d attempts', len(items), attempt + 1)
+                    if self.on_drop is not None:
+                        self.on_drop(items)
+                    return
+                time.sleep(0.1 * 2 ** attempt)
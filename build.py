@@ -0,0 +1,717 @@
+#!/usr/bin/env python3
+"""
+Static asset build for the website
+Minifies CSS/JS/HTML/JSON, fingerprints stylesheets and scripts with a content hash,
+rewrites the references in the HTML pages and writes .gz/.br siblings for nginx's
+gzip_static/brotli_static. Only sources whose content changed are rebuilt.
+
+Each locale is also split into a small critical chunk and one chunk per section,
+listed in locales/manifest.json, so script.js only fetches what the visitor sees.
+The product pages are pre-rendered once per language (index.ja.html, ...) for
+nginx to pick from ?lang=, the lang cookie or Accept-Language. Images listed in
+assets/images/optimized/manifest.json (see optimize_images.py) get width/height,
+srcset and AVIF/WebP sources.
+
+rcssmin, rjsmin and brotli are used when installed; without them the built-in
+minifiers run and only .gz copies are written.
+
+Usage: python build.py [--out dist] [--clean]
+"""
+
+import os
+import re
+import sys
+import json
+import gzip
+import glob
+import shutil
+import hashlib
+import argparse
+import tempfile
+from html import escape
+from html.parser import HTMLParser
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import rcssmin
+except ImportError:
+    rcssmin = None
+
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+STATE_FILE = '.build-manifest.json'
+HASH_LENGTH = 10  # nginx.conf matches fingerprinted names on this length
+
+PAGES = ['index.html', 'doppler-phantom.html', 'hifu-generator.html', 'admin.html']
+LOCALIZED_PAGES = ['index.html', 'doppler-phantom.html', 'hifu-generator.html']
+DEFAULT_LANGUAGE = 'en'
+FINGERPRINTED = ['css/*.css', 'script.js']
+DATA = ['locales/*.json']
+LOCALE_MANIFEST = 'locales/manifest.json'
+IMAGE_DIR = 'assets/images'
+IMAGE_MANIFEST = 'assets/images/optimized/manifest.json'
+# <source> types offered ahead of the <img> fallback, most preferred first
+IMAGE_SOURCE_TYPES = ('avif', 'webp')
+COPIED = ['robots.txt', 'sitemap-pages.xml', 'BingSiteAuth.xml', 'llms.txt', 'llms-full.txt', 'styles.css', 'assets/**/*']
+
+# Compressed siblings are written for these types above nginx's gzip_min_length
+COMPRESSIBLE = {'.html', '.css', '.js', '.json', '.svg', '.xml', '.txt'}
+COMPRESS_MIN_BYTES = 1024
+
+# Locale keys shown before any scrolling on some page (header, heroes, title)
+LOCALE_CRITICAL = ('meta', 'nav', 'aria', 'hero', 'trust', 'home.hero', 'doppler.hero', 'hifu.hero', 'hifu.trust')
+# Namespaces of whole pages; their chunks are split one level deeper, by section
+LOCALE_PAGES = ('home', 'doppler', 'hifu')
+
+
+# --- minifiers -------------------------------------------------------------
+
+CSS_TOKEN_RE = re.compile(r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')|/\*.*?\*/''', re.DOTALL)
+
+
+def minify_css(text):
+    if rcssmin is not None:
+        return rcssmin.cssmin(text)
+
+    def squeeze(code):
+        code = re.sub(r'\s+', ' ', code)
+        code = re.sub(r'\s*([{};,>])\s*', r'\1', code)
+        # Only after a colon: a space before one is a descendant combinator in selectors
+        return re.sub(r':\s+', ':', code)
+
+    parts = []
+    last = 0
+    for match in CSS_TOKEN_RE.finditer(text):
+        parts.append(squeeze(text[last:match.start()]))
+        if match.group(1):  # strings are kept verbatim; comments are dropped
+            parts.append(match.group(1))
+        else:
+            parts.append(' ')
+        last = match.end()
+    parts.append(squeeze(text[last:]))
+    return re.sub(r';}', '}', ''.join(parts)).strip()
+
+
+JS_WORD = re.compile(r'[A-Za-z0-9_$\\]')
+JS_REGEX_KEYWORDS = {'return', 'typeof', 'case', 'do', 'else', 'in', 'instanceof', 'new', 'delete', 'void', 'throw', 'yield', 'await'}
+# A newline can go when the line ends (or the next one starts) with one of
+# these, since no automatic semicolon can be inserted there
+JS_JOIN_AFTER = set('{;,([=:?&|*<>!~%^')
+JS_JOIN_BEFORE = set('})],;.?:')
+
+
+class JSMinifier:
+    """Removes comments and indentation from JavaScript without changing any tokens.
+
+    Strings, template literals (including nested ``${}``) and regex literals
+    are copied verbatim. Newlines are kept wherever automatic semicolon
+    insertion could depend on them.
+    """
+
+    def __init__(self, src):
+        self.src = src
+        self.out = []
+        self.last_token = ''
+
+    def minify(self):
+        self.code(0, nested=False)
+        return ''.join(self.out).strip() + '\n'
+
+    def emit(self, text, token=None):
+        self.out.append(text)
+        self.last_token = token if token is not None else text[-1]
+
+    def last_char(self):
+        for chunk in reversed(self.out):
+            if chunk:
+                return chunk[-1]
+        return ''
+
+    def regex_allowed(self):
+        last = self.last_token
+        if not last:
+            return True
+        if last in JS_REGEX_KEYWORDS:
+            return True
+        return not (JS_WORD.match(last[-1]) or last[-1] in ')]"\'`')
+
+    def code(self, i, nested):
+        src = self.src
+        n = len(src)
+        depth = 0
+        while i < n:
+            c = src[i]
+            nxt = src[i + 1] if i + 1 < n else ''
+
+            if c in '"\'':
+                j = self.skip_string(i, c)
+                self.emit(src[i:j], '"')
+                i = j
+            elif c == '`':
+                i = self.template(i)
+            elif c == '/' and nxt == '/':
+                while i < n and src[i] != '\n':
+                    i += 1
+            elif c == '/' and nxt == '*':
+                end = src.find('*/', i + 2)
+                end = n if end == -1 else end + 2
+                i = self.whitespace(i, end, newline='\n' in src[i:end])
+            elif c == '/' and self.regex_allowed():
+                j = self.skip_regex(i)
+                self.emit(src[i:j], '/re/')
+                i = j
+            elif c.isspace():
+                j = i
+                while j < n and src[j].isspace():
+                    j += 1
+                i = self.whitespace(i, j, newline='\n' in src[i:j])
+            elif c == '{':
+                depth += 1
+                self.emit(c)
+                i += 1
+            elif c == '}':
+                if nested and depth == 0:
+                    self.emit(c)
+                    return i + 1
+                depth -= 1
+                self.emit(c)
+                i += 1
+            elif JS_WORD.match(c):
+                j = i
+                while j < n and JS_WORD.match(src[j]):
+                    j += 1
+                self.emit(src[i:j], src[i:j])
+                i = j
+            else:
+                self.emit(c)
+                i += 1
+        return i
+
+    def whitespace(self, start, end, newline):
+        """Replace a run of whitespace/comments with the least that keeps tokens apart."""
+        prev = self.last_char()
+        src = self.src
+        j = end
+        while j < len(src) and src[j] in ' \t':
+            j += 1
+        following = src[j] if j < len(src) else ''
+
+        if not prev or not following:
+            return end
+        if newline and prev not in JS_JOIN_AFTER and following not in JS_JOIN_BEFORE:
+            self.out.append('\n')
+        elif JS_WORD.match(prev) and JS_WORD.match(following):
+            self.out.append(' ')
+        elif prev == following and prev in '+-/':
+            self.out.append(' ')
+        return end
+
+    def skip_string(self, i, quote):
+        src = self.src
+        j = i + 1
+        while j < len(src):
+            if src[j] == '\\':
+                j += 2
+                continue
+            if src[j] == quote:
+                return j + 1
+            j += 1
+        return j
+
+    def skip_regex(self, i):
+        src = self.src
+        j = i + 1
+        in_class = False
+        while j < len(src):
+            c = src[j]
+            if c == '\\':
+                j += 2
+                continue
+            if c == '[':
+                in_class = True
+            elif c == ']':
+                in_class = False
+            elif c == '/' and not in_class:
+                j += 1
+                break
+            elif c == '\n':
+                break
+            j += 1
+        while j < len(src) and src[j].isalpha():
+            j += 1
+        return j
+
+    def template(self, i):
+        src = self.src
+        start = i
+        j = i + 1
+        while j < len(src):
+            c = src[j]
+            if c == '\\':
+                j += 2
+                continue
+            if c == '`':
+                self.emit(src[start:j + 1], '`')
+                return j + 1
+            if c == '$' and j + 1 < len(src) and src[j + 1] == '{':
+                self.emit(src[start:j + 2], '{')
+                j = self.code(j + 2, nested=True)
+                start = j
+                continue
+            j += 1
+        self.emit(src[start:j], '`')
+        return j
+
+
+def minify_js(text):
+    if rjsmin is not None:
+        return rjsmin.jsmin(text)
+    return JSMinifier(text).minify()
+
+
+HTML_RAW_RE = re.compile(r'(<(pre|textarea|script|style)\b[^>]*>)(.*?)(</\2\s*>)', re.IGNORECASE | re.DOTALL)
+HTML_COMMENT_RE = re.compile(r'<!--(?!\[if).*?-->', re.DOTALL)
+
+
+def minify_html(text):
+    """Collapse whitespace runs and drop comments outside pre/textarea/script/style.
+
+    One whitespace character is kept wherever there was some, so inline
+    layout doesn't change. Inline CSS and JSON-LD are minified too.
+    """
+    def squeeze(chunk):
+        chunk = HTML_COMMENT_RE.sub('', chunk)
+        return re.sub(r'\s+', lambda m: '\n' if '\n' in m.group(0) else ' ', chunk)
+
+    def raw(match):
+        open_tag, tag, body, close_tag = match.groups()
+        tag = tag.lower()
+        if tag == 'style':
+            body = minify_css(body)
+        elif tag == 'script' and 'application/ld+json' in open_tag:
+            try:
+                body = json.dumps(json.loads(body), ensure_ascii=False, separators=(',', ':'))
+            except ValueError:
+                pass
+        return f'{squeeze(open_tag)}{body}{close_tag}'
+
+    parts = []
+    last = 0
+    for match in HTML_RAW_RE.finditer(text):
+        parts.append(squeeze(text[last:match.start()]))
+        parts.append(raw(match))
+        last = match.end()
+    parts.append(squeeze(text[last:]))
+    return ''.join(parts).strip() + '\n'
+
+
+def minify_json(text):
+    return json.dumps(json.loads(text), ensure_ascii=False, separators=(',', ':'))
+
+
+MINIFIERS = {'.css': minify_css, '.js': minify_js, '.html': minify_html, '.json': minify_json}
+
+
+# --- locales -------------------------------------------------------------------
+
+def locale_chunk(key):
+    """Chunk a translation key belongs to: ``critical``, ``doppler.faq``, ``contact``..."""
+    if any(key == prefix or key.startswith(prefix + '.') for prefix in LOCALE_CRITICAL):
+        return 'critical'
+    parts = key.split('.')
+    if parts[0] in LOCALE_PAGES and len(parts) > 2:
+        return '.'.join(parts[:2])
+    return parts[0]
+
+
+def split_locale(lang, data):
+    """Minified, fingerprinted chunks of one locale: ``{chunk: (path, bytes)}``."""
+    chunks = {}
+    for key, value in data.items():
+        chunks.setdefault(locale_chunk(key), {})[key] = value
+    files = {}
+    for chunk, entries in sorted(chunks.items()):
+        body = json.dumps(entries, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        files[chunk] = (fingerprint(f'locales/{lang}/{chunk}.json', body), body)
+    return files
+
+
+class TranslatableElements(HTMLParser):
+    """Collects ``data-i18n*`` elements (and ``<html>``) of a page with source offsets.
+
+    Each entry is ``[attrs, tag_start, tag_end, content_end]``; ``content_end``
+    stays None for elements without a closing tag.
+    """
+
+    VOID = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'}
+
+    def __init__(self, text):
+        super().__init__(convert_charrefs=True)
+        self.lines = [0]
+        for line in text.splitlines(keepends=True):
+            self.lines.append(self.lines[-1] + len(line))
+        self.elements = []
+        self.open = []
+        self.feed(text)
+        self.close()
+
+    def position(self):
+        line, column = self.getpos()
+        return self.lines[line - 1] + column
+
+    def add(self, attrs):
+        start = self.position()
+        element = [attrs, start, start + len(self.get_starttag_text()), None]
+        self.elements.append(element)
+        return element
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        for entry in self.open:
+            if entry[0] == tag:
+                entry[1] += 1
+        if tag == 'html' or any(name.startswith('data-i18n') for name in attrs):
+            element = self.add(attrs)
+            if tag not in self.VOID and 'data-i18n' in attrs:
+                self.open.append([tag, 1, element])
+
+    def handle_startendtag(self, tag, attrs):
+        attrs = dict(attrs)
+        if any(name.startswith('data-i18n') for name in attrs):
+            self.add(attrs)
+
+    def handle_endtag(self, tag):
+        for entry in reversed(self.open):
+            if entry[0] == tag:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    entry[2][3] = self.position()
+                    self.open.remove(entry)
+                break
+
+
+ATTRIBUTE_RE = r'(\s){}=("[^"]*"|\'[^\']*\'|[^\s>]+)'
+
+
+def set_attribute(tag_text, name, value):
+    """Replace or add ``name="value"`` in a start tag."""
+    quoted = f'{name}="{escape(value)}"'
+    pattern = re.compile(ATTRIBUTE_RE.format(re.escape(name)))
+    if pattern.search(tag_text):
+        return pattern.sub(lambda m: m.group(1) + quoted, tag_text, count=1)
+    end = len(tag_text) - (2 if tag_text.endswith('/>') else 1)
+    return f'{tag_text[:end].rstrip()} {quoted}{tag_text[end:]}'
+
+
+def alternate_urls(text):
+    """``{lang: url}`` from the page's ``<link rel="alternate" hreflang>`` tags."""
+    urls = {}
+    for tag in re.findall(r'<link\b[^>]*\bhreflang="[^>]*>', text):
+        lang = re.search(r'hreflang="([^"]+)"', tag).group(1).split('-')[0]
+        href = re.search(r'href="([^"]+)"', tag)
+        if href and lang != 'x':
+            urls.setdefault(lang, href.group(1))
+    return urls
+
+
+def localize_page(text, lang, strings, fallback):
+    """The page as script.js would leave it after translating to ``lang``.
+
+    ``<html>`` gets ``data-i18n-rendered`` so the client skips its own
+    translation pass, and canonical/og:url point at the language's URL.
+    """
+    def translate(key):
+        return strings.get(key) or fallback.get(key)
+
+    edits = []
+    for attrs, tag_start, tag_end, content_end in TranslatableElements(text).elements:
+        tag_text = text[tag_start:tag_end]
+        if re.match(r'<html\b', tag_text, re.IGNORECASE):
+            tag_text = set_attribute(set_attribute(tag_text, 'lang', lang), 'data-i18n-rendered', lang)
+        for attr, target in (('data-i18n-aria', 'aria-label'), ('data-i18n-placeholder', 'placeholder')):
+            value = attrs.get(attr) and translate(attrs[attr])
+            if value:
+                tag_text = set_attribute(tag_text, target, value)
+        value = attrs.get('data-i18n') and translate(attrs['data-i18n'])
+        if value and content_end is not None:
+            # Same rule as applyTranslations: markup is kept, plain text escaped
+            content = value if '<' in value else escape(value, quote=False)
+            edits.append((tag_start, content_end, tag_text + content))
+        else:
+            edits.append((tag_start, tag_end, tag_text))
+
+    parts = []
+    last = 0
+    for start, end, replacement in sorted(edits):
+        parts.append(text[last:start])
+        parts.append(replacement)
+        last = end
+    parts.append(text[last:])
+    text = ''.join(parts)
+
+    url = alternate_urls(text).get(lang)
+    if url:
+        text = re.sub(r'(<link rel="canonical" href=")[^"]*', lambda m: m.group(1) + url, text, count=1)
+        text = re.sub(r'(<meta property="og:url" content=")[^"]*', lambda m: m.group(1) + url, text, count=1)
+    return text
+
+
+def localized_name(path, lang):
+    stem, ext = os.path.splitext(path)
+    return path if lang == DEFAULT_LANGUAGE else f'{stem}.{lang}{ext}'
+
+
+# --- images --------------------------------------------------------------------
+
+IMG_TAG_RE = re.compile(r'<img\b[^>]*>', re.IGNORECASE)
+
+
+def responsive_images(text, images):
+    """Give ``<img>`` tags of optimized images their size, srcset and modern formats.
+
+    ``images`` is the optimize_images.py manifest. Tags that already have a
+    srcset are left alone; the tag's own ``sizes`` is copied to the sources.
+    """
+    def replace(match):
+        tag = match.group(0)
+        src = re.search(r'\ssrc="([^"]+)"', tag)
+        if not src or re.search(r'\ssrcset=', tag):
+            return tag
+        url = src.group(1)
+        prefix = '/' if url.startswith('/') else ''
+        path = url.lstrip('/').removeprefix('./')
+        entry = images.get(path.removeprefix(IMAGE_DIR + '/')) if path.startswith(IMAGE_DIR + '/') else None
+        if not entry:
+            return tag
+
+        def srcset(fmt):
+            return ', '.join(f'{prefix}{item["path"]} {item["width"]}w' for item in entry['formats'][fmt])
+
+        sizes = re.search(r'\ssizes="[^"]*"', tag)
+        tag = set_attribute(tag, 'width', str(entry['width']))
+        tag = set_attribute(tag, 'height', str(entry['height']))
+        tag = set_attribute(tag, 'srcset', srcset(entry['fallback']))
+        sources = ''.join(
+            f'<source type="image/{fmt}" srcset="{srcset(fmt)}"{sizes.group(0) if sizes else ""}>'
+            for fmt in IMAGE_SOURCE_TYPES if fmt in entry['formats'] and fmt != entry['fallback']
+        )
+        return f'<picture>{sources}{tag}</picture>'
+    return IMG_TAG_RE.sub(replace, text)
+
+
+# --- output ------------------------------------------------------------------
+
+def fingerprint(path, data):
+    stem, ext = os.path.splitext(path)
+    return f'{stem}.{hashlib.sha256(data).hexdigest()[:HASH_LENGTH]}{ext}'
+
+
+def write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.build-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def compressed_siblings(path, data):
+    if os.path.splitext(path)[1] not in COMPRESSIBLE or len(data) < COMPRESS_MIN_BYTES:
+        return {}
+    siblings = {path + '.gz': gzip.compress(data, 9, mtime=0)}
+    if brotli is not None:
+        siblings[path + '.br'] = brotli.compress(data, quality=11)
+    return siblings
+
+
+def expand(patterns):
+    paths = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(os.path.join(ROOT, pattern), recursive=True))
+        paths.extend(os.path.relpath(p, ROOT) for p in matches if os.path.isfile(p))
+    return [p.replace(os.sep, '/') for p in paths]
+
+
+class Build:
+    """One build into ``out``, skipping sources whose inputs are unchanged."""
+
+    def __init__(self, out):
+        self.out = out
+        self.state_path = os.path.join(out, STATE_FILE)
+        try:
+            with open(self.state_path) as f:
+                self.previous = json.load(f)
+        except (OSError, ValueError):
+            self.previous = {}
+        self.state = {}
+        self.assets = {}
+        self.locales = {}
+        self.built = 0
+        self.skipped = 0
+
+    def unchanged(self, source, key):
+        entry = self.previous.get(source)
+        return bool(entry and entry['key'] == key and 'result' in entry
+                    and all(os.path.exists(os.path.join(self.out, name)) for name in entry['outputs']))
+
+    def emit(self, source, key, outputs, result=None):
+        """Write ``outputs`` (name -> bytes) plus compressed copies, unless ``key`` is unchanged.
+
+        ``result`` (a hashed URL, a chunk map) is remembered and returned
+        again on later runs that skip the source.
+        """
+        if self.unchanged(source, key):
+            self.state[source] = self.previous[source]
+            self.skipped += 1
+            return self.previous[source]['result']
+
+        files = {}
+        for name, data in outputs.items():
+            files[name] = data
+            files.update(compressed_siblings(name, data))
+        for name, data in files.items():
+            write_atomic(os.path.join(self.out, name), data)
+
+        self.state[source] = {'key': key, 'outputs': sorted(files), 'result': result}
+        self.built += 1
+        return result
+
+    def source(self, path):
+        with open(os.path.join(ROOT, path), 'rb') as f:
+            return f.read()
+
+    def run(self):
+        # Fingerprinted assets first: pages need their final names
+        for path in expand(FINGERPRINTED):
+            data = self.source(path)
+            key = hashlib.sha256(data).hexdigest()
+            ext = os.path.splitext(path)[1]
+            if self.unchanged(path, key):
+                url = self.emit(path, key, {})
+            else:
+                minified = MINIFIERS[ext](data.decode('utf-8')).encode('utf-8')
+                url = fingerprint(path, minified)
+                # The plain name stays available for anything not rewritten
+                # (dev volume mounts, pages rendered by the API), without immutable caching
+                self.emit(path, key, {url: minified, path: minified}, url)
+            self.assets[path] = url
+
+        for path in expand(DATA):
+            data = self.source(path)
+            key = hashlib.sha256(data).hexdigest()
+            lang = os.path.splitext(os.path.basename(path))[0]
+            if self.unchanged(path, key):
+                chunks = self.emit(path, key, {})
+            else:
+                # The whole file stays as the fallback when the manifest can't be loaded
+                outputs = {path: minify_json(data.decode('utf-8')).encode('utf-8')}
+                chunks = {}
+                for chunk, (name, body) in split_locale(lang, json.loads(data)).items():
+                    outputs[name] = body
+                    chunks[chunk] = name.removeprefix('locales/')
+                self.emit(path, key, outputs, chunks)
+            self.locales[lang] = chunks
+            # Pages preload the full English file; point that at its critical chunk instead
+            if 'critical' in chunks:
+                self.assets[path] = f'locales/{chunks["critical"]}'
+
+        manifest = json.dumps({'critical': LOCALE_CRITICAL, 'languages': self.locales},
+                              sort_keys=True, separators=(',', ':')).encode('utf-8')
+        self.emit(LOCALE_MANIFEST, hashlib.sha256(manifest).hexdigest(), {LOCALE_MANIFEST: manifest})
+
+        for path in expand(COPIED):
+            data = self.source(path)
+            self.emit(path, hashlib.sha256(data).hexdigest(), {path: data})
+
+        # A page is rebuilt when it, any asset name it may reference, the
+        # optimized images or (for localized pages) any locale changes
+        try:
+            image_key = self.source(IMAGE_MANIFEST)
+            images = json.loads(image_key)
+        except (OSError, ValueError):
+            image_key, images = b'', {}
+        asset_key = json.dumps(self.assets, sort_keys=True).encode('utf-8') + image_key
+        locale_key = b''.join(self.source(path) for path in expand(DATA))
+        locales = None
+        for path in PAGES:
+            data = self.source(path)
+            localized = path in LOCALIZED_PAGES
+            key = hashlib.sha256(data + asset_key + (locale_key if localized else b'')).hexdigest()
+            if self.unchanged(path, key):
+                self.emit(path, key, {})
+                continue
+            text = responsive_images(self.rewrite_references(data.decode('utf-8')), images)
+            if not localized:
+                self.emit(path, key, {path: minify_html(text).encode('utf-8')})
+                continue
+            if locales is None:
+                locales = {os.path.splitext(os.path.basename(name))[0]: json.loads(self.source(name))
+                           for name in expand(DATA)}
+            fallback = locales.get(DEFAULT_LANGUAGE, {})
+            self.emit(path, key, {
+                localized_name(path, lang): minify_html(localize_page(text, lang, strings, fallback)).encode('utf-8')
+                for lang, strings in sorted(locales.items())
+            })
+
+        self.remove_stale()
+        write_atomic(self.state_path, json.dumps(self.state, indent=1, sort_keys=True).encode('utf-8'))
+
+    def rewrite_references(self, text):
+        """Point href/src attributes at fingerprinted names, dropping ``?v=`` cache busters."""
+        def replace(match):
+            attr, quote, url = match.groups()
+            path = url.split('#')[0].split('?')[0]
+            prefix = '/' if path.startswith('/') else ''
+            hashed = self.assets.get(path.lstrip('/').removeprefix('./'))
+            if not hashed:
+                return match.group(0)
+            return f'{attr}={quote}{prefix}{hashed}{quote}'
+        return re.sub(r'''\b(href|src)=(["'])([^"']+)\2''', replace, text)
+
+    def remove_stale(self):
+        current = {name for entry in self.state.values() for name in entry['outputs']}
+        for entry in self.previous.values():
+            for name in entry.get('outputs', []):
+                if name not in current:
+                    try:
+                        os.remove(os.path.join(self.out, name))
+                    except FileNotFoundError:
+                        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build minified, fingerprinted, precompressed site assets')
+    parser.add_argument('--out', default=os.path.join(ROOT, 'dist'), help='output directory (default: dist/)')
+    parser.add_argument('--clean', action='store_true', help='delete the output directory first')
+    args = parser.parse_args()
+
+    out = os.path.abspath(args.out)
+    if args.clean and os.path.isdir(out):
+        shutil.rmtree(out)
+    os.makedirs(out, exist_ok=True)
+
+    build = Build(out)
+    build.run()
+
+    print(f'Built {build.built} file(s), {build.skipped} unchanged -> {out}')
+    if rcssmin is None or rjsmin is None:
+        print('  rcssmin/rjsmin not installed: used the built-in minifiers')
+    if brotli is None:
+        print('  brotli not installed: wrote .gz copies only')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
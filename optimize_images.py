@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Responsive image build for assets/images
+Resizes every raster image to a few widths and encodes AVIF, WebP and the source
+format into assets/images/optimized on a process pool. Originals are never touched.
+
+optimized/manifest.json records each source's hash, dimensions and outputs, so
+unchanged images are skipped and build.py can add width/height and srcset to pages.
+Output names carry a hash of the source and settings, for immutable caching.
+
+Usage: python optimize_images.py [--workers N] [--force] [--list]
+"""
+
+import os
+import sys
+import json
+import hashlib
+import argparse
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:
+    Image = None
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+SOURCE_DIR = os.path.join(ROOT, 'assets', 'images')
+OUTPUT_DIR = os.path.join(SOURCE_DIR, 'optimized')
+MANIFEST = os.path.join(OUTPUT_DIR, 'manifest.json')
+HASH_LENGTH = 10  # nginx.conf caches name.<10 hex>.ext as immutable
+
+# Widths (px) generated below the original; the original width (capped) is always included
+RESPONSIVE_WIDTHS = (320, 640, 960)
+MAX_WIDTH = 1600
+
+# Same encoder settings as the API's upload variants (backend/images.py)
+ENCODERS = {
+    'avif': ('AVIF', {'quality': 55, 'speed': 6}),
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+    'png': ('PNG', {'optimize': True}),
+}
+EXTENSIONS = {'avif': 'avif', 'webp': 'webp', 'jpeg': 'jpg', 'png': 'png'}
+SOURCE_FORMATS = {'jpg': 'jpeg', 'jpeg': 'jpeg', 'png': 'png'}
+
+
+def modern_formats():
+    formats = ['webp']
+    if features.check('avif'):
+        formats.insert(0, 'avif')
+    return formats
+
+
+def sources():
+    """Raster images directly under assets/images, as names relative to it."""
+    names = []
+    for name in sorted(os.listdir(SOURCE_DIR)):
+        ext = name.rsplit('.', 1)[-1].lower() if '.' in name else ''
+        if ext in SOURCE_FORMATS and os.path.isfile(os.path.join(SOURCE_DIR, name)):
+            names.append(name)
+    return names
+
+
+def source_key(path, formats):
+    """Hash of the source bytes and everything that affects its outputs."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    settings = {'widths': RESPONSIVE_WIDTHS, 'max': MAX_WIDTH, 'formats': formats,
+                'encoders': {fmt: ENCODERS[fmt] for fmt in formats}}
+    digest.update(json.dumps(settings, sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def target_widths(width):
+    largest = min(width, MAX_WIDTH)
+    return sorted({w for w in RESPONSIVE_WIDTHS if w < largest} | {largest})
+
+
+def output_name(name, width, fmt, key):
+    stem = name.rsplit('.', 1)[0]
+    return f'{stem}-{width}.{key[:HASH_LENGTH]}.{EXTENSIONS[fmt]}'
+
+
+def render(src_path, dest_path, width, fmt):
+    """Encode one output; runs in a worker process. Returns its (width, height)."""
+    encoder, options = ENCODERS[fmt]
+    with Image.open(src_path) as img:
+        img = ImageOps.exif_transpose(img)
+        if img.width > width:
+            height = round(img.height * width / img.width)
+            img = img.resize((width, height), Image.LANCZOS)
+        if fmt == 'jpeg' and img.mode not in ('RGB', 'L'):
+            img = img.convert('RGB')
+        elif img.mode == 'P':
+            img = img.convert('RGBA')
+
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(dest_path), prefix='.optimize-')
+        os.close(fd)
+        try:
+            img.save(tmp_path, encoder, **options)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, dest_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return img.size
+
+
+def load_manifest():
+    try:
+        with open(MANIFEST) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def output_paths(entry):
+    return [item['path'] for items in entry.get('formats', {}).values() for item in items]
+
+
+def up_to_date(entry, key):
+    return bool(entry and entry.get('key') == key
+                and all(os.path.exists(os.path.join(ROOT, path)) for path in output_paths(entry)))
+
+
+def optimize(workers=None, force=False):
+    """Bring optimized/ up to date; returns (rendered, skipped) source counts."""
+    previous = load_manifest()
+    manifest = {}
+    formats = modern_formats()
+    jobs = {}
+
+    for name in sources():
+        src_path = os.path.join(SOURCE_DIR, name)
+        fallback = SOURCE_FORMATS[name.rsplit('.', 1)[-1].lower()]
+        entry_formats = formats + [fallback]
+        key = source_key(src_path, entry_formats)
+        if not force and up_to_date(previous.get(name), key):
+            manifest[name] = previous[name]
+            continue
+
+        with Image.open(src_path) as img:
+            width, height = ImageOps.exif_transpose(img).size
+        manifest[name] = {'key': key, 'width': width, 'height': height, 'fallback': fallback,
+                          'formats': {fmt: [] for fmt in entry_formats}}
+        for target in target_widths(width):
+            for fmt in entry_formats:
+                path = os.path.join(OUTPUT_DIR, output_name(name, target, fmt, key))
+                jobs[(name, fmt, target)] = (src_path, path)
+
+    if jobs:
+        os.makedirs(OUTPUT_DIR, exist_ok=True)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(render, src, dest, width, fmt): (name, fmt, width, dest)
+                       for (name, fmt, width), (src, dest) in jobs.items()}
+            for future in as_completed(futures):
+                name, fmt, width, dest = futures[future]
+                out_width, out_height = future.result()
+                manifest[name]['formats'][fmt].append({
+                    'width': out_width,
+                    'height': out_height,
+                    'path': os.path.relpath(dest, ROOT).replace(os.sep, '/'),
+                })
+        for entry in manifest.values():
+            for items in entry['formats'].values():
+                items.sort(key=lambda item: item['width'])
+
+    # Outputs of changed or deleted sources
+    current = {path for entry in manifest.values() for path in output_paths(entry)}
+    for entry in previous.values():
+        for path in output_paths(entry):
+            if path not in current:
+                try:
+                    os.remove(os.path.join(ROOT, path))
+                except FileNotFoundError:
+                    pass
+
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=OUTPUT_DIR, prefix='.manifest-')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+        f.write('\n')
+    os.chmod(tmp_path, 0o644)
+    os.replace(tmp_path, MANIFEST)
+
+    rendered = len({name for name, _, _ in jobs})
+    return rendered, len(manifest) - rendered
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate responsive AVIF/WebP/original-format images')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: CPU count)')
+    parser.add_argument('--force', action='store_true', help='re-encode every image')
+    parser.add_argument('--list', action='store_true', help='print image dimensions from the manifest and exit')
+    args = parser.parse_args()
+
+    if args.list:
+        for name, entry in sorted(load_manifest().items()):
+            print(f'assets/images/{name}: {entry["width"]}x{entry["height"]}')
+        return 0
+
+    if Image is None:
+        print('Pillow is not installed: pip install pillow', file=sys.stderr)
+        return 1
+
+    rendered, skipped = optimize(args.workers, args.force)
+    print(f'Optimized {rendered} image(s), {skipped} unchanged -> {os.path.relpath(OUTPUT_DIR, ROOT)}')
+    if 'avif' not in modern_formats():
+        print('  Pillow has no AVIF support: wrote WebP only')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
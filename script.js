@@ -269,13 +269,21 @@ if ("serviceWorker" in navigator) {
 // INTERNATIONALIZATION (i18n) SUPPORT
 // Languages: English, Hindi, Chinese, Japanese
 // Translation files are loaded from /locales/*.json
+// Built sites split each file into chunks (see build.py): the critical
+// chunk loads first and section chunks load as the sections scroll near
 // ==========================================
 
 // Supported languages configuration
 const SUPPORTED_LANGUAGES = ["en", "zh", "ja", "hi"];
 const DEFAULT_LANGUAGE = "en";
 
-// Translation cache - stores loaded translations
+// Lists the hashed chunk files per language; absent in unbuilt checkouts
+const LOCALE_MANIFEST_URL = "/locales/manifest.json";
+// Cache Storage bucket keeping chunks for offline visits
+const LOCALE_CACHE_NAME = "i18n-chunks";
+
+// Translation cache - stores loaded translations (whole files by language,
+// chunk loads by "lang/chunk")
 const translationsCache = {};
 
 // Runtime translations store - populated dynamically from /locales/*.json files
@@ -301,12 +309,31 @@ class I18n {
     this.currentLang = DEFAULT_LANGUAGE;
     this.isLoading = false;
     this.loadPromise = null;
+    this.manifest = null;
+    this.manifestPromise = null;
+    this.neededChunks = new Set(["critical"]);
+    this.cachePromise = null;
+    this.observing = false;
   }
 
   async init() {
-    this.currentLang = this.getStoredLanguage() || this.detectLanguage();
+    // Set by build.py on pages nginx picked for ?lang=, the lang cookie or Accept-Language
+    const rendered = document.documentElement.dataset.i18nRendered;
+    const stored = this.getStoredLanguage();
+    if (stored) {
+      this.storeLanguage(stored);
+    }
+    this.currentLang = stored || rendered || this.detectLanguage();
     
     this.loadLanguageFont(this.currentLang);
+    if (this.currentLang === rendered) {
+      // Already in the right language: no translation pass and no geo lookup.
+      // Translations load on the first language change.
+      this.setupLanguageSelector();
+      return;
+    }
+
+    await this.loadManifestOnce();
     await this.loadTranslations(this.currentLang);
     
     if (this.currentLang !== DEFAULT_LANGUAGE) {
@@ -316,6 +343,7 @@ class I18n {
     this.setupLanguageSelector();
     this.applyTranslations();
     this.updateDocumentLang();
+    this.observeSections();
 
     if (!this.getStoredLanguage()) {
       this.detectCountry().then((lang) => {
@@ -327,6 +355,11 @@ class I18n {
   }
 
   async loadTranslations(lang) {
+    if (this.manifest) {
+      await Promise.all([...this.neededChunks].map((chunk) => this.loadChunk(lang, chunk)));
+      return translations[lang] || null;
+    }
+
     if (translationsCache[lang]) {
       translations[lang] = translationsCache[lang];
       return translationsCache[lang];
@@ -347,6 +380,154 @@ class I18n {
     }
   }
 
+  openLocaleCache() {
+    if (!this.cachePromise) {
+      this.cachePromise = "caches" in window ? caches.open(LOCALE_CACHE_NAME).catch(() => null) : Promise.resolve(null);
+    }
+    return this.cachePromise;
+  }
+
+  loadManifestOnce() {
+    if (!this.manifestPromise) {
+      this.manifestPromise = this.loadManifest().then((manifest) => (this.manifest = manifest));
+    }
+    return this.manifestPromise;
+  }
+
+  async loadManifest() {
+    const cache = await this.openLocaleCache();
+    let response;
+    try {
+      response = await fetch(LOCALE_MANIFEST_URL, {cache: "no-cache"});
+    } catch (error) {
+      // Offline: reuse the manifest the cached chunks belong to
+      const cached = cache && (await cache.match(LOCALE_MANIFEST_URL));
+      return cached ? cached.json() : null;
+    }
+    if (!response.ok) return null;
+
+    const manifest = await response.clone().json();
+    if (cache) {
+      cache.put(LOCALE_MANIFEST_URL, response).catch(() => {});
+      this.pruneLocaleCache(cache, manifest);
+    }
+    return manifest;
+  }
+
+  async pruneLocaleCache(cache, manifest) {
+    const current = new Set([LOCALE_MANIFEST_URL]);
+    Object.values(manifest.languages).forEach((chunks) => {
+      Object.values(chunks).forEach((file) => current.add(`/locales/${file}`));
+    });
+    try {
+      const requests = await cache.keys();
+      requests.forEach((request) => {
+        if (!current.has(new URL(request.url).pathname)) {
+          cache.delete(request);
+        }
+      });
+    } catch (e) {}
+  }
+
+  loadChunk(lang, chunk) {
+    const file = this.manifest.languages[lang]?.[chunk];
+    if (!file) return Promise.resolve(null);
+
+    const cacheKey = `${lang}/${chunk}`;
+    if (!translationsCache[cacheKey]) {
+      translationsCache[cacheKey] = this.fetchChunk(`/locales/${file}`)
+        .then((data) => {
+          translations[lang] = Object.assign(translations[lang] || {}, data);
+          return data;
+        })
+        .catch((error) => {
+          delete translationsCache[cacheKey];
+          console.warn(`Could not load ${chunk} translations for ${lang}:`, error.message);
+          return null;
+        });
+    }
+    return translationsCache[cacheKey];
+  }
+
+  async fetchChunk(url) {
+    // Chunk names carry a content hash, so a cached copy is never stale
+    const cache = await this.openLocaleCache();
+    const cached = cache && (await cache.match(url).catch(() => null));
+    if (cached) return cached.json();
+
+    const response = await fetch(url);
+    if (!response.ok) {
+      throw new Error(`Failed to load ${url}`);
+    }
+    if (cache) {
+      cache.put(url, response.clone()).catch(() => {});
+    }
+    return response.json();
+  }
+
+  chunkFor(key) {
+    const {critical, languages} = this.manifest;
+    if (critical.some((prefix) => key === prefix || key.startsWith(`${prefix}.`))) {
+      return "critical";
+    }
+    const chunks = languages[DEFAULT_LANGUAGE] || {};
+    const parts = key.split(".");
+    for (let i = parts.length - 1; i > 0; i--) {
+      const name = parts.slice(0, i).join(".");
+      if (chunks[name]) return name;
+    }
+    return null;
+  }
+
+  // Load each section's chunks shortly before the section scrolls into view
+  observeSections() {
+    if (!this.manifest || this.observing) return;
+    this.observing = true;
+
+    const pending = new Map();
+    document.querySelectorAll("[data-i18n], [data-i18n-aria], [data-i18n-placeholder]").forEach((el) => {
+      const keys = [el.dataset.i18n, el.dataset.i18nAria, el.dataset.i18nPlaceholder];
+      keys.forEach((key) => {
+        const chunk = key && this.chunkFor(key);
+        if (!chunk || this.neededChunks.has(chunk)) return;
+        const container = el.closest("section, footer") || document.body;
+        if (!pending.has(container)) pending.set(container, new Set());
+        pending.get(container).add(chunk);
+      });
+    });
+
+    if (!("IntersectionObserver" in window)) {
+      pending.forEach((chunks) => this.requireChunks(chunks));
+      return;
+    }
+
+    const observer = new IntersectionObserver(
+      (entries) => {
+        entries.forEach((entry) => {
+          if (!entry.isIntersecting) return;
+          observer.unobserve(entry.target);
+          this.requireChunks(pending.get(entry.target));
+        });
+      },
+      {rootMargin: "400px 0px"}
+    );
+    pending.forEach((chunks, container) => observer.observe(container));
+  }
+
+  async requireChunks(chunks) {
+    const missing = [...chunks].filter((chunk) => !this.neededChunks.has(chunk));
+    if (!missing.length) return;
+    missing.forEach((chunk) => this.neededChunks.add(chunk));
+
+    const langs = this.currentLang === DEFAULT_LANGUAGE ? [DEFAULT_LANGUAGE] : [this.currentLang, DEFAULT_LANGUAGE];
+    await Promise.all(langs.flatMap((lang) => missing.map((chunk) => this.loadChunk(lang, chunk))));
+    if (!langs.includes(this.currentLang)) {
+      // The language changed while these were loading
+      await this.loadTranslations(this.currentLang);
+    }
+    this.applyTranslations();
+  }
+
   detectLanguage() {
     const urlParams = new URLSearchParams(window.location.search);
     const urlLang = urlParams.get("lang");
@@ -382,6 +563,8 @@ class I18n {
     try {
       localStorage.setItem("preferred_language", lang);
     } catch (e) {}
+    // Lets nginx serve the pre-rendered page in this language next time
+    document.cookie = `lang=${lang}; path=/; max-age=31536000; samesite=lax`;
   }
 
   async detectCountry() {
@@ -456,12 +639,17 @@ class I18n {
     if (!SUPPORTED_LANGUAGES.includes(lang)) return;
 
     this.loadLanguageFont(lang);
+    await this.loadManifestOnce();
     await this.loadTranslations(lang);
+    if (lang !== DEFAULT_LANGUAGE) {
+      await this.loadTranslations(DEFAULT_LANGUAGE);
+    }
     
     this.currentLang = lang;
     this.storeLanguage(lang);
     this.applyTranslations();
     this.updateDocumentLang();
+    this.observeSections();
 
     const url = new URL(window.location);
     if (lang === DEFAULT_LANGUAGE) {
@@ -513,11 +701,6 @@ class I18n {
         el.setAttribute("placeholder", translation);
       }
     });
-
-    const titleTranslation = currentTranslations["meta.title"] || fallbackTranslations["meta.title"];
-    if (titleTranslation) {
-      document.title = titleTranslation;
-    }
   }
 
   updateDocumentLang() {
@@ -720,7 +903,7 @@ class Blog {
       <article class="blog-card" data-slug="${this.escapeHtml(post.slug)}">
         <div class="blog-card-image${post.featured_image ? ' has-image' : ''}">
           ${post.featured_image
-            ? `<img src="${this.escapeHtml(post.featured_image)}" alt="${this.escapeHtml(post.title)}" loading="lazy">`
+            ? `<img src="${this.escapeHtml(post.featured_image)}"${this.imageSrcset(post.featured_image)} alt="${this.escapeHtml(post.title)}" loading="lazy">`
             : `<svg viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="1.5">
             <path d="M19 20H5a2 2 0 0 1-2-2V6a2 2 0 0 1 2-2h10a2 2 0 0 1 2 2v1m2 13a2 2 0 0 1-2-2V7m2 13a2 2 0 0 0 2-2V9a2 2 0 0 0-2-2h-2m-4-3H9M7 16h6M7 8h6v4H7V8z"/>
           </svg>`}
@@ -729,6 +912,7 @@ class Blog {
           <div class="blog-card-meta">
             <span class="blog-card-category">${this.escapeHtml(post.category)}</span>
             <span class="blog-card-date">${this.formatDate(post.created_at)}</span>
+            ${post.comment_count ? `<span class="blog-card-date">${post.comment_count === 1 ? "1 comment" : `${post.comment_count} comments`}</span>` : ""}
           </div>
           <h3>${this.escapeHtml(post.title)}</h3>
           <p class="blog-card-excerpt">${this.escapeHtml(post.excerpt || "")}</p>
@@ -866,17 +1050,20 @@ class Blog {
 
   // ============ Comments Methods ============
 
-  async loadComments(slug) {
+  async loadComments(slug, cursor = null) {
     try {
-      const data = await this.fetchAPI(`/posts/${slug}/comments`);
-      this.renderComments(data.comments, data.total);
+      const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : "";
+      const data = await this.fetchAPI(`/posts/${slug}/comments${query}`);
+      // Root comments are paginated; later pages are appended to the thread list
+      this.loadedComments = cursor ? this.loadedComments.concat(data.comments) : data.comments;
+      this.renderComments(this.loadedComments, data.total, data.pagination && data.pagination.next_cursor);
     } catch (error) {
       console.error("Failed to load comments:", error);
       this.commentsList.innerHTML = '<p class="no-comments">Failed to load comments.</p>';
     }
   }
 
-  renderComments(comments, total) {
+  renderComments(comments, total, nextCursor = null) {
     document.getElementById("comment-count").textContent = `(${total})`;
 
     if (!comments || comments.length === 0) {
@@ -893,6 +1080,18 @@ class Blog {
 
     this.commentsList.innerHTML = comments.map((comment) => this.renderComment(comment)).join("");
 
+    if (nextCursor) {
+      const loadMore = document.createElement("button");
+      loadMore.type = "button";
+      loadMore.className = "btn btn-outline";
+      loadMore.textContent = "Load more comments";
+      loadMore.addEventListener("click", () => {
+        loadMore.disabled = true;
+        this.loadComments(this.currentSlug, nextCursor);
+      });
+      this.commentsList.appendChild(loadMore);
+    }
+
     // Add reply button listeners
     this.commentsList.querySelectorAll(".reply-btn").forEach((btn) => {
       btn.addEventListener("click", () => {
@@ -948,6 +1147,21 @@ class Blog {
     document.getElementById("replying-to").classList.add("hidden");
   }
 
+  // New comments are accepted with 202 and written in the background; poll briefly
+  // so the reloaded thread includes the new one
+  async waitForComment(pendingId, attempts = 10) {
+    if (!pendingId) return;
+    for (let i = 0; i < attempts; i++) {
+      await new Promise((resolve) => setTimeout(resolve, 200));
+      try {
+        const status = await this.fetchAPI(`/comments/pending/${pendingId}`);
+        if (status.status === "stored") return;
+      } catch (error) {
+        // May not be visible from this server yet; keep polling
+      }
+    }
+  }
+
   async handleCommentSubmit(e) {
     e.preventDefault();
 
@@ -965,14 +1179,21 @@ class Blog {
     };
 
     try {
-      await this.fetchAPI(`/posts/${this.currentSlug}/comments`, {
+      const result = await this.fetchAPI(`/posts/${this.currentSlug}/comments`, {
         method: "POST",
         body: JSON.stringify(data),
       });
 
-      // Success - reload comments and reset form
+      // Only a queued (pending_id) or stored (comment) reply means it was accepted;
+      // anything else would drop the comment silently
+      if (!result || (!result.pending_id && !result.comment)) {
+        throw new Error(result?.error || "Comment was not accepted");
+      }
+
+      // Success - reset form, wait for the queued comment to be saved, then reload
       this.commentForm.reset();
       this.cancelReply();
+      await this.waitForComment(result.pending_id);
       await this.loadComments(this.currentSlug);
 
       submitBtn.textContent = "Posted!";
@@ -1023,6 +1244,13 @@ class Blog {
     });
   }
 
+  // Resized WebP/AVIF variants are served by the API for its own uploads
+  imageSrcset(url) {
+    if (!url || !url.includes("/api/uploads/") || url.includes("?")) return "";
+    const src = this.escapeHtml(url);
+    return ` srcset="${src}?w=320&format=auto 320w, ${src}?w=640&format=auto 640w" sizes="(max-width: 640px) 100vw, 400px"`;
+  }
+
   getInitials(name) {
     return name
       .split(" ")
@@ -1049,8 +1277,24 @@ document.addEventListener("DOMContentLoaded", () => {
 function changeImage(src, element) {
   const mainImage = document.getElementById("main-product-image");
   if (mainImage) {
+    const thumbImage = element.querySelector("img");
     mainImage.src = src;
-    mainImage.alt = element.querySelector("img").alt;
+    mainImage.alt = thumbImage.alt;
+
+    // Built pages (build.py) give both images a srcset and AVIF/WebP <source>s
+    if (thumbImage.srcset) {
+      mainImage.srcset = thumbImage.srcset;
+      mainImage.setAttribute("width", thumbImage.getAttribute("width"));
+      mainImage.setAttribute("height", thumbImage.getAttribute("height"));
+    }
+    if (mainImage.parentElement.tagName === "PICTURE" && thumbImage.parentElement.tagName === "PICTURE") {
+      const thumbSources = thumbImage.parentElement.querySelectorAll("source");
+      mainImage.parentElement.querySelectorAll("source").forEach((source, i) => {
+        if (thumbSources[i]) {
+          source.srcset = thumbSources[i].srcset;
+        }
+      });
+    }
   }
 
   // Update active thumbnail